@@ -1,14 +1,19 @@
 """Implement the additive sparse boosting regressor."""
 from __future__ import annotations
 
+import os
 import warnings
+from bisect import bisect_right
+from collections.abc import Iterable
+from collections.abc import Iterator
+from collections.abc import Mapping
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
 import attrs
 import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
-import shap
-from plotly.subplots import make_subplots
 from sklearn.base import BaseEstimator
 from sklearn.base import RegressorMixin
 from sklearn.exceptions import NotFittedError
@@ -19,19 +24,44 @@ from model_helpers.custom_types import OneVectorFunction
 from model_helpers.custom_types import Self
 from model_helpers.custom_types import Target
 from model_helpers.custom_types import TwoVectorFunction
+from model_helpers.feature_index import FeatureIndex
 from model_helpers.mrmr_functions import absolute_correlation_matrix
 from model_helpers.mrmr_functions import f_regression_score
 from model_helpers.mrmr_functions import safe_divide
 from model_helpers.od_tree import ListTreeRegressor
 from model_helpers.od_tree import ListTreeRegressorCV
 from model_helpers.od_tree import sum_tree_regressors
-from model_helpers.plotting import plot_categorical
-from model_helpers.plotting import plot_continuous
 from model_helpers.preprocessor import TreePreprocessor
+from model_helpers.relevancy_statistics import FRegressionStatistics
 from model_helpers.sample_generators import generator_dict
+from model_helpers.scorer import BINS
+from model_helpers.scorer import CATEGORIES
+from model_helpers.scorer import RAW
+from model_helpers.scorer import AdditiveScorer
+from model_helpers.scorer import load_scorer
+from model_helpers.sql_export import _float32_threshold
+from model_helpers.sql_export import scorer_to_sql
+from potts.potts_wrapper import PottsWorkspace
+
+# shap and plotly are slow to import and only used to explain the model,
+# so they are imported on first use
+if TYPE_CHECKING:
+    import shap
 
 
 _MAGIC_CATBOOST_CONSTANTS = [0.189, -4.383, -0.623, 1.439]
+# The attributes only used while fitting, released after fit
+_TRAINING_STATE = (
+    "_prediction_cache",
+    "_feature_index",
+    "_relevancy_statistics",
+    "_y",
+    "_flat_regressors",
+    "_regressors",
+    "_potts_workspace",
+    "get_weights",
+)
+_DEFAULT_CHUNK_SIZE = 65_536
 
 
 def _is_auto_or_float(_, attribute, value):
@@ -43,6 +73,34 @@ def _is_auto_or_float(_, attribute, value):
         raise ValueError(f"Invalid value for {attribute.name}: {value}")
 
 
+def _iter_chunks(X: Data | Iterator[Data], chunk_size: int) -> Iterator[Data]:
+    """Split data into chunks of rows. An iterator is taken as an iterator of
+    chunks, and is passed through."""
+    if isinstance(X, Iterator):
+        yield from X
+        return
+    if not isinstance(X, pd.DataFrame):
+        X = np.asarray(X)
+    for start in range(0, len(X), chunk_size):
+        yield X[start : start + chunk_size]
+
+
+def _check_chunk_size(chunk_size: int | None) -> None:
+    """Check that a chunk size is None or a positive number of rows."""
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError(
+            f"Invalid chunk_size: {chunk_size}, expected a positive integer."
+        )
+
+
+def _effective_n_jobs(n_jobs: int) -> int:
+    """Get the number of threads to use, negative values count back from the
+    number of CPUs as in scikit-learn."""
+    if n_jobs < 0:
+        return max((os.cpu_count() or 1) + 1 + n_jobs, 1)
+    return max(n_jobs, 1)
+
+
 @attrs.define(slots=False, kw_only=True)
 class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
     r"""A sparse generalized additive model with decision trees.
@@ -90,12 +148,26 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
         The minimum L0 regularization to use for the split selection.
     max_l0_fused_regularization : float, default=100.0, range=(0.0, inf)
         The maximum L0 regularization to use for the split selection.
+    candidate_trees : {"auto", "path", "bisection", "segments"}, default="auto"
+        How the candidate trees of each feature are found,
+        see `ListTreeRegressorCV`.
+    potts_method : {"auto", "dp", "pelt"}, default="auto"
+        The Potts solver of the candidate trees, see `ListTreeRegressor`.
+        "auto" uses "pelt" for the features with more values than the
+        `max_path_bins` of `ListTreeRegressorCV`, and "dp" otherwise.
     relevancy_scorer : TwoVectorFunction, default=f_regression_score
         The function to use to score the relevancy of the features.
     redundancy_matrix : OneVectorFunction, default=absolute_correlation_matrix
         The function to use to compute the redundancy matrix.
     mrmr_scheme : TwoVectorFunction, default=np.subtract
         The minimum redundancy maximum relevancy scheme to use.
+    n_jobs : int, default=1
+        The number of threads to use to predict, each scoring a block of rows.
+        -1 means using all processors.
+    keep_training_state : bool, default=False
+        Whether to keep the caches and per-iteration estimators of the training
+        after fit. They take memory proportional to the number of training rows
+        times the number of estimators, and are never pickled.
     categorical_features : list of int, optional
         The indices of the categorical features. The estimator will never try to
         deduce which features are categorical without this information.
@@ -184,6 +256,13 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
     max_leaves: int = attrs.field(
         default=32, validator=attrs.validators.gt(0), converter=int
     )
+    candidate_trees: str = attrs.field(
+        default="auto",
+        validator=attrs.validators.in_(("auto", "path", "bisection", "segments")),
+    )
+    potts_method: str = attrs.field(
+        default="auto", validator=attrs.validators.in_(("auto", "dp", "pelt"))
+    )
     # Functions for scoring and selecting features
     relevancy_scorer: TwoVectorFunction = attrs.field(default=f_regression_score)
     redundancy_matrix: OneVectorFunction = attrs.field(
@@ -191,6 +270,9 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
     )
     mrmr_scheme: TwoVectorFunction = attrs.field(default=safe_divide)
     redundancy_exponent: float = attrs.field(default=1.0, converter=float)
+    # Inference Hyper-parameters
+    n_jobs: int = attrs.field(default=1, converter=int)
+    keep_training_state: bool = attrs.field(default=False)
     # Optional information arguments
     categorical_features: list[int] = attrs.field(factory=list)
     output_name: str = attrs.field(default=None)
@@ -209,10 +291,14 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
     _n: int = attrs.field(init=False, repr=False)
     _m: int = attrs.field(init=False, repr=False)
     _is_fitted: bool = attrs.field(init=False, repr=False, default=False)
-    _indexing_cache: list[tuple[np.ndarray, ...] | None] = attrs.field(
-        init=False, repr=False
-    )
+    _feature_index: FeatureIndex = attrs.field(init=False, repr=False)
+    _relevancy_statistics: FRegressionStatistics = attrs.field(init=False, repr=False)
     _prediction_cache: np.ndarray = attrs.field(init=False, repr=False)
+    _potts_workspace: PottsWorkspace = attrs.field(init=False, repr=False)
+    _selected_features: np.ndarray = attrs.field(init=False, repr=False)
+    _table_rows: np.ndarray = attrs.field(init=False, repr=False)
+    _lookup_table: np.ndarray = attrs.field(init=False, repr=False)
+    _row_scorers: list[tuple] = attrs.field(init=False, repr=False)
     _y: np.ndarray = attrs.field(init=False, repr=False)
 
     @selection_history_.default  # type: ignore
@@ -266,15 +352,19 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
         else:
             X_val, y_val = validation_set
         self._initialize_fit_params(X, y)
-        # Convert the data to numpy arrays
+        # Convert the data to numpy arrays, stored feature by feature since
+        # the features are used one at a time
         y_train = np.ascontiguousarray(y, dtype=np.float64)
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
-            X_train = np.ascontiguousarray(
+            X_train = np.asfortranarray(
                 self.preprocessor_.fit_transform(X, y_train),
-                dtype=np.float32,
+                dtype=self.preprocessor_.get_output_dtype(),
             )
-        X_val = np.array(self.preprocessor_.transform(X_val), dtype=np.float32)
+        X_val = np.asfortranarray(
+            self.preprocessor_.transform(X_val),
+            dtype=self.preprocessor_.get_output_dtype(),
+        )
         y_val = np.array(y_val, dtype=np.float64)
         # Fit the model and correct the bias
         self._fit(X_train, y_train, X_val, y_val)
@@ -288,14 +378,42 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
                 for i, regressor in enumerate(self.regressors_)
             ]
         )
+        self._compile_tables()
+        self._compile_row_scorers()
         # Get the history
         self.selection_history_ = self.selection_history_[: self.n_estimators]
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
             np.sqrt(self.score_history_, out=self.score_history_)
+        if not self.keep_training_state:
+            self._release_training_state()
         self._is_fitted = True
         return self  # type: ignore
 
+    def _release_training_state(self) -> None:
+        """Release the attributes only used while fitting."""
+        for name in _TRAINING_STATE:
+            setattr(self, name, None)
+
+    def __getstate__(self) -> dict:
+        """Get the state to pickle, without the training state."""
+        state = super().__getstate__()
+        return {
+            name: None if name in _TRAINING_STATE else value
+            for name, value in state.items()
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        """Restore the pickled state, with the lookup tables of the regressors
+        as views of the stacked table again."""
+        super().__setstate__(state)
+        if not self._is_fitted:
+            return
+        for feature, row in zip(self._selected_features, self._table_rows):
+            if row >= 0:
+                regressor = self.regressors_[feature]
+                regressor.table_ = self._lookup_table[row, : len(regressor.table_)]
+
     def _initialize_fit_params(self, X: Data, y: Target) -> None:
         """Initialize the parameters for fitting."""
         self._m, self._n = np.array(X).shape
@@ -310,7 +428,8 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
         self._n_trials = int(self.row_subsample * self._m)
         self._regressors: list[list[ListTreeRegressor]] = [[] for _ in range(self._n)]
         self._flat_regressors: list[ListTreeRegressor] = []
-        self._indexing_cache = [None for _ in range(self._n)]
+        # Shared by all the tree fits, a feature has at most max_bins values
+        self._potts_workspace = PottsWorkspace(self.max_bins, self.max_leaves)
         self._prediction_cache = np.empty(
             (self.n_estimators, self._m),
             dtype=np.float32,
@@ -354,6 +473,13 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
         residual = y - self.intercept_
         self._y = residual.copy()
         residual_valid = y_val - self.intercept_
+        self._feature_index = FeatureIndex.from_matrix(X)
+        # The default relevancy is updated from the changes of the residual
+        self._relevancy_statistics = None
+        if self.relevancy_scorer is f_regression_score:
+            self._relevancy_statistics = FRegressionStatistics.from_residual(
+                X, residual, self._feature_index
+            )
         # First round
         self._boost(X, residual, 0.0, 0, X_val, residual_valid)
         # Initialize redundancy for the next rounds
@@ -383,7 +509,6 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
             self.n_estimators = 1
         else:
             self.n_estimators = best_estimator  # type: ignore
-        self._regressors = self._regressors[: self.n_estimators]
         self.selection_history_ = self.selection_history_[: self.n_estimators]
         self.selection_count_ = np.unique(self.selection_history_, return_counts=True)[
             1
@@ -400,13 +525,16 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
     ) -> None:
         """Boost the model by fitting a new function and updating the residual."""
         # Select the best feature
-        relevancy = self.relevancy_scorer(X, y)
+        if self._relevancy_statistics is not None:
+            relevancy = self._relevancy_statistics.score(y)
+        else:
+            relevancy = self.relevancy_scorer(X, y)
         score = self.mrmr_scheme(relevancy, redundancy**self.redundancy_exponent)
         selected_feature: int = np.argmax(score)  # type: ignore
         self.selection_history_[model_count] = selected_feature
         self.selection_count_[selected_feature] += 1
         # Getting X
-        x_passed, split, _ = self._get_index(X, selected_feature)
+        x_passed, codes, counts = self._feature_index.get(selected_feature)
         random_weights = self.get_weights()
         validation_weights = random_weights == 0
         while np.all(validation_weights) or np.all(~validation_weights):
@@ -434,11 +562,11 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
         else:
             y_dropout = y
             learning_rate = self.learning_rate_
+        # Aggregate by value of the feature in single passes over the rows
         y_weighed = y_dropout * random_weights
-        y_means = np.array([np.mean(y_weighed[indices]) for indices in split])
-        weights = np.array([np.sum(random_weights[indices]) for indices in split])
-        # y_means = mean_reducer(y_weighed, split)
-        # weights = sum_reducer(random_weights, split)
+        y_means = np.bincount(codes, weights=y_weighed, minlength=len(x_passed))
+        y_means /= counts
+        weights = np.bincount(codes, weights=random_weights, minlength=len(x_passed))
         x_validation = X[validation_weights, selected_feature]
         y_validation = y[validation_weights]
         new_model = ListTreeRegressorCV(
@@ -448,11 +576,21 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
             min_l0_fused_regularization=self.min_l0_fused_regularization,
             learning_rate=learning_rate,
             max_leaves=self.max_leaves,
+            candidate_trees=self.candidate_trees,
+            workspace=self._potts_workspace,
         )
+        if self.potts_method != "auto":
+            new_model.potts_method = self.potts_method
+        elif len(x_passed) > new_model.max_path_bins:
+            new_model.potts_method = "pelt"
         new_model.fit(x_passed, y_means, weights, x_validation, y_validation)
-        y_pred = new_model.predict(X[:, selected_feature])
+        # The prediction is a step function of the value of the feature
+        steps = new_model.predict(x_passed)
+        y_pred = steps[codes]
         self._prediction_cache[model_count] = y_pred
         y -= y_pred
+        if self._relevancy_statistics is not None:
+            self._relevancy_statistics.update(selected_feature, steps)
         # Score the model on the validation set
         y_pred_val = new_model.predict(X_val[:, selected_feature])
         y_val -= y_pred_val
@@ -464,18 +602,231 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
         self._regressors[selected_feature].append(new_model)
         self._flat_regressors.append(new_model)
 
-    def _get_index(self, X: np.ndarray, feature: int) -> tuple[np.ndarray, ...]:
-        """Get the ordered indexes of the feature."""
-        if self._indexing_cache[feature] is None:
-            x = X[:, feature]
-            x_passed, inverse_indices = np.unique(x, return_inverse=True)
-            sorted_indices = np.argsort(inverse_indices)
-            sorted_x = x[sorted_indices]
-            split_indices = np.where(np.diff(sorted_x) != 0)[0] + 1
-            split = np.split(sorted_indices, split_indices)
-            weights = np.array([len(indices) for indices in split], dtype=np.float64)
-            self._indexing_cache[feature] = (x_passed, split, weights)
-        return self._indexing_cache[feature]
+    def _compile_tables(self) -> None:
+        """Compile the regressors of the discretized features to lookup tables.
+
+        The tables of the selected features are stacked in the rows of one
+        contiguous table, and the regressors keep views of their rows.
+        """
+        bin_counts = self.preprocessor_.get_bin_counts()
+        for regressor, bin_count in zip(self.regressors_, bin_counts):
+            if bin_count > 0:
+                regressor.compile_table(bin_count)
+        self._selected_features = np.array(
+            [
+                i
+                for i, regressor in enumerate(self.regressors_)
+                if regressor.is_selected
+            ],
+            dtype=np.intp,
+        )
+        tabled_features = [
+            feature
+            for feature in self._selected_features
+            if self.regressors_[feature].table_ is not None
+        ]
+        self._table_rows = np.full(len(self._selected_features), -1, dtype=np.intp)
+        self._lookup_table = np.zeros(
+            (len(tabled_features), max(bin_counts[tabled_features], default=0))
+        )
+        for row, feature in enumerate(tabled_features):
+            regressor = self.regressors_[feature]
+            table = self._lookup_table[row, : bin_counts[feature]]
+            table[:] = regressor.table_
+            regressor.table_ = table
+            self._table_rows[self._selected_features == feature] = row
+
+    def _compile_row_scorers(self) -> None:
+        """Compile the preprocessing and the regressors of the selected features
+        to plain Python lists and dicts, to score single rows without NumPy
+        arrays or the preprocessor.
+
+        A discretized feature is scored by bisecting its bin edges into its
+        lookup table, an encoded categorical feature by a dict from its
+        categories to their predictions, and any other feature by bisecting
+        the splits of its tree. The edges and splits are compared with the
+        values as float32, so they are moved to the float64 thresholds giving
+        the same comparisons, and the raw values can be bisected directly.
+        """
+        bin_edges = self.preprocessor_.get_bin_edges()
+        category_maps = self.preprocessor_.get_category_maps()
+        self._row_scorers = []
+        for feature in self._selected_features:
+            regressor = self.regressors_[feature]
+            if regressor.table_ is not None:
+                edges = [_float32_threshold(edge) for edge in bin_edges[feature]]
+                values = regressor.table_.tolist()
+                default = 0.0
+            elif category_maps[feature] is not None:
+                categories, encodings, default_encoding = category_maps[feature]
+                predictions = regressor.predict(
+                    np.append(encodings, default_encoding).astype(np.float32)
+                )
+                edges = None
+                values = dict(zip(categories.tolist(), predictions[:-1].tolist()))
+                default = float(predictions[-1])
+            else:
+                edges = [
+                    _float32_threshold(split)
+                    for split in regressor.list_tree_.split_values
+                ]
+                values = (
+                    regressor.learning_rate * regressor.list_tree_.leaf_values
+                    - regressor.bias
+                ).tolist()
+                default = 0.0
+            self._row_scorers.append(
+                (
+                    int(feature),
+                    str(self.feature_names_in_[feature]),
+                    edges,
+                    values,
+                    default,
+                )
+            )
+
+    def export_scorer(self) -> AdditiveScorer:
+        r"""Export a standalone scorer of the model.
+
+        The scorer holds the imputation value, the bin edges, the category
+        encodings and the additive functions of the selected features as
+        flat arrays, and only depends on NumPy, so it can be pickled and
+        used where scikit-learn, pandas, shap and plotly are not installed.
+
+        Returns
+        -------
+        AdditiveScorer
+            The scorer, with the same predictions as the model.
+
+        """
+        self._validate_fitted()
+        bin_edges = self.preprocessor_.get_bin_edges()
+        category_maps = self.preprocessor_.get_category_maps()
+        kinds, learning_rates, biases, default_encodings = [], [], [], []
+        edge_list, table_list, category_list, encoding_list = [], [], [], []
+        split_list, leaf_list = [], []
+        for feature in self._selected_features:
+            regressor = self.regressors_[feature]
+            edges = np.empty(0)
+            table = np.empty(0)
+            categories = np.empty(0)
+            encodings = np.empty(0)
+            default_encoding = 0.0
+            if regressor.table_ is not None:
+                kinds.append(BINS)
+                edges = bin_edges[feature]
+                table = regressor.table_
+            elif category_maps[feature] is not None:
+                kinds.append(CATEGORIES)
+                categories, encodings, default_encoding = category_maps[feature]
+            else:
+                kinds.append(RAW)
+            learning_rates.append(regressor.learning_rate)
+            biases.append(regressor.bias)
+            default_encodings.append(default_encoding)
+            edge_list.append(edges)
+            table_list.append(table)
+            category_list.append(categories)
+            encoding_list.append(encodings)
+            split_list.append(regressor.list_tree_.split_values)
+            leaf_list.append(regressor.list_tree_.leaf_values)
+
+        def concatenate(arrays: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+            offsets = np.cumsum([0, *map(len, arrays)], dtype=np.int64)
+            return np.concatenate([np.empty(0), *arrays]).astype(np.float64), offsets
+
+        arrays = {
+            "columns": self._selected_features.astype(np.int64),
+            "kinds": np.array(kinds, dtype=np.int8),
+            "learning_rates": np.array(learning_rates, dtype=np.float64),
+            "biases": np.array(biases, dtype=np.float64),
+            "default_encodings": np.array(default_encodings, dtype=np.float64),
+        }
+        arrays["bin_edges"], arrays["bin_edge_offsets"] = concatenate(edge_list)
+        arrays["tables"], arrays["table_offsets"] = concatenate(table_list)
+        arrays["categories"], arrays["category_offsets"] = concatenate(category_list)
+        arrays["encodings"], _ = concatenate(encoding_list)
+        arrays["split_values"], arrays["split_offsets"] = concatenate(split_list)
+        arrays["leaf_values"], arrays["leaf_offsets"] = concatenate(leaf_list)
+        return AdditiveScorer(
+            n_features=len(self.feature_names_in_),
+            fill_value=self.fill_value,
+            intercept=float(self.intercept_),
+            feature_names=[str(name) for name in self.feature_names_in_],
+            output_name=str(self.output_name),
+            arrays=arrays,
+        )
+
+    def save_model(self, path: str) -> None:
+        r"""Save what is needed to predict to a compact binary file.
+
+        The file holds the bin edges, the category encodings, the intercept
+        and the trees of the selected features, as flat arrays. It is loaded
+        by `load_model` as an `AdditiveScorer`, which predicts like the model.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file.
+
+        """
+        self.export_scorer().save(path)
+
+    def to_sql(self, dialect: str = "ansi") -> str:
+        r"""Render the model as a SQL expression, to predict in a database.
+
+        The expression reads the raw feature columns, named after
+        `feature_names_in_`: it fills the missing values, bins the numerical
+        features with CASE ladders on thresholds mapped back to the raw values,
+        maps the categories, and adds the functions of the selected features
+        and the intercept.
+
+        Parameters
+        ----------
+        dialect : str, default="ansi"
+            The SQL dialect, which sets how the columns are quoted, e.g.
+            "sqlite", "postgres", "mysql", "bigquery" or "tsql".
+
+        Returns
+        -------
+        str
+            The SQL expression of the prediction.
+
+        """
+        return scorer_to_sql(self.export_scorer(), dialect)
+
+    def _accumulate_prediction(self, X_arr: np.ndarray, out: np.ndarray) -> None:
+        """Add the contributions of the selected features to out, in place.
+
+        X_arr holds the transformed selected features, in order. The bin codes
+        of each feature are gathered from its row of the stacked table into
+        a buffer reused for all the features, so the memory used does not
+        grow with the number of features.
+        """
+        codes = np.empty(len(out), dtype=np.intp)
+        values = np.empty(len(out), dtype=np.float64)
+        for i, (feature, row) in enumerate(
+            zip(self._selected_features, self._table_rows)
+        ):
+            if row < 0:
+                out += self.regressors_[feature].predict(X_arr[:, i])
+                continue
+            np.copyto(codes, X_arr[:, i], casting="unsafe")
+            np.take(self._lookup_table[row], codes, out=values)
+            out += values
+
+    def _contribution_matrix(self, X: Data) -> np.ndarray:
+        """Compute the contribution of each feature, transforming only
+        the selected features."""
+        X_arr = self.preprocessor_.transform_features(X, self._selected_features)
+        contribution = np.zeros((len(X_arr), len(self.regressors_)))
+        for i, feature in enumerate(self._selected_features):
+            regressor = self.regressors_[feature]
+            if regressor.table_ is not None:
+                contribution[:, feature] = regressor.predict_codes(X_arr[:, i])
+            else:
+                contribution[:, feature] = regressor.predict(X_arr[:, i])
+        return contribution
 
     def _validate_fitted(self) -> None:
         """Validate that the model is fitted."""
@@ -507,13 +858,7 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
 
         """
         self._validate_fitted()
-        X_arr = np.ascontiguousarray(self.preprocessor_.transform(X))
-        contribution = np.array(
-            [
-                regressor.predict(X_arr[:, i])
-                for i, regressor in enumerate(self.regressors_)
-            ]
-        ).T
+        contribution = self._contribution_matrix(X)
         contribution_df = pd.DataFrame(contribution, columns=self.feature_names_in_)
         if only_selected:
             selected_index = [
@@ -547,14 +892,10 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
             The SHAP explanation of the model decision at the data X.
 
         """
+        import shap
+
         self._validate_fitted()
-        X_arr = np.ascontiguousarray(self.preprocessor_.transform(X))
-        contribution = np.array(
-            [
-                regressor.predict(X_arr[:, i])
-                for i, regressor in enumerate(self.regressors_)
-            ]
-        ).T
+        contribution = self._contribution_matrix(X)
         data = X
         if only_selected:
             selected_index = [
@@ -572,13 +913,26 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
             output_names=[self.output_name],
         )
 
-    def predict(self, X: Data) -> Target:
+    def predict(
+        self,
+        X: Data | Iterator[Data],
+        chunk_size: int | None = None,
+        n_jobs: int | None = None,
+    ) -> Target:
         r"""Predict the response for the data.
 
         Parameters
         ----------
-        X : Data of shape (n_samples, n_features)
-            The data to predict the response for.
+        X : Data of shape (n_samples, n_features), or iterator of Data
+            The data to predict the response for, or chunks of rows of it.
+        chunk_size : int, optional
+            If given, the rows are preprocessed and scored by chunks of at most
+            this size, written to the output as they are predicted, which bounds
+            the memory used by the preprocessing.
+        n_jobs : int, optional
+            The number of threads scoring the chunks of rows, by default
+            the `n_jobs` of the model. Without `chunk_size`, the rows are split
+            into one block per thread. The predictions do not depend on it.
 
         Returns
         -------
@@ -587,19 +941,130 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
 
         """
         self._validate_fitted()
-        X_arr = np.ascontiguousarray(self.preprocessor_.transform(X), dtype=np.float32)
-        intercept_vector = np.full(len(X), self.intercept_)
-        return intercept_vector + np.sum(
-            [
-                regressor.predict(X_arr[:, i])
-                for i, regressor in enumerate(self.regressors_)
-                if regressor.is_selected
-            ],
-            axis=0,
+        _check_chunk_size(chunk_size)
+        n_jobs = _effective_n_jobs(self.n_jobs if n_jobs is None else n_jobs)
+        if isinstance(X, Iterator):
+            chunks = list(self.predict_iter(X, n_jobs=n_jobs))
+            return np.concatenate(chunks) if chunks else np.empty(0)
+        if chunk_size is None and n_jobs == 1:
+            return self._predict_chunk(X)
+        if not isinstance(X, pd.DataFrame):
+            X = np.asarray(X)
+        if chunk_size is None:
+            chunk_size = max(-(-len(X) // n_jobs), 1)
+        prediction = np.empty(len(X), dtype=np.float64)
+
+        def predict_block(start: int) -> None:
+            prediction[start : start + chunk_size] = self._predict_chunk(
+                X[start : start + chunk_size]
+            )
+
+        starts = range(0, len(X), chunk_size)
+        if n_jobs > 1 and len(starts) > 1:
+            with ThreadPoolExecutor(max_workers=min(n_jobs, len(starts))) as executor:
+                list(executor.map(predict_block, starts))
+        else:
+            for start in starts:
+                predict_block(start)
+        return prediction
+
+    def predict_iter(
+        self,
+        X: Data | Iterator[Data],
+        chunk_size: int = _DEFAULT_CHUNK_SIZE,
+        n_jobs: int | None = None,
+    ) -> Iterator[np.ndarray]:
+        r"""Predict the response for the data, chunk by chunk.
+
+        Only one chunk is preprocessed at a time, so the memory used does not
+        depend on the number of rows, e.g. to score data larger than memory.
+
+        Parameters
+        ----------
+        X : Data of shape (n_samples, n_features), or iterator of Data
+            The data to predict the response for. Arrays and DataFrames are
+            split into chunks of rows, an iterator is taken as the chunks,
+            e.g. ``pd.read_csv(path, chunksize=...)``.
+        chunk_size : int, default=65536
+            The number of rows of the chunks of arrays and DataFrames.
+        n_jobs : int, optional
+            The number of threads scoring each chunk, see `predict`.
+
+        Returns
+        -------
+        Iterator of np.ndarray
+            The predicted response for each chunk.
+
+        """
+        self._validate_fitted()
+        _check_chunk_size(chunk_size)
+        return (
+            self.predict(chunk, n_jobs=n_jobs) for chunk in _iter_chunks(X, chunk_size)
         )
 
+    def _predict_chunk(self, X: Data) -> np.ndarray:
+        """Predict the response for rows of data, all at once. Only the selected
+        features are transformed."""
+        X_arr = self.preprocessor_.transform_features(X, self._selected_features)
+        prediction = np.zeros(len(X_arr), dtype=np.float64)
+        self._accumulate_prediction(X_arr, prediction)
+        prediction += self.intercept_
+        return prediction
+
+    def predict_one(self, row: Sequence[float] | Mapping[str, float]) -> float:
+        r"""Predict the response for a single row, with low latency.
+
+        The row is scored with the tables compiled at fit time, without
+        the preprocessor, and the prediction is equal to the one of `predict`.
+
+        Parameters
+        ----------
+        row : sequence of float, or mapping from feature name to float
+            The values of the features. Missing features of a mapping,
+            None and NaN are missing values.
+
+        Returns
+        -------
+        float
+            The predicted response.
+
+        """
+        self._validate_fitted()
+        is_record = isinstance(row, Mapping)
+        prediction = 0.0
+        for column, name, edges, values, default in self._row_scorers:
+            x = row.get(name) if is_record else row[column]
+            if x is None or x != x:
+                x = self.fill_value
+            if edges is None:
+                prediction += values.get(x, default)
+            else:
+                prediction += values[bisect_right(edges, x)]
+        return float(prediction + self.intercept_)
+
+    def predict_records(
+        self, records: Iterable[Sequence[float] | Mapping[str, float]]
+    ) -> np.ndarray:
+        r"""Predict the response for rows given one by one, see `predict_one`.
+
+        Parameters
+        ----------
+        records : iterable of rows
+            The rows, e.g. a list of dicts from feature name to value.
+
+        Returns
+        -------
+        np.ndarray of shape (n_records,)
+            The predicted response.
+
+        """
+        return np.fromiter((self.predict_one(row) for row in records), dtype=np.float64)
+
     def _plot_learning_curve(self) -> None:
         r"""Plot the learning curve of the model."""
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
+
         fig = make_subplots(specs=[[{"secondary_y": True}]])
         training, validation = self.score_history_.T
         iteration_count = np.arange(self.n_estimators)
@@ -706,6 +1171,9 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
         selected: list[tuple],
     ) -> None:
         r"""Plot the shape functions of each feature."""
+        from model_helpers.plotting import plot_categorical
+        from model_helpers.plotting import plot_continuous
+
         for feature_index, model in selected:
             if feature_index not in self.categorical_features:
                 x_vals, index = np.unique(X[:, feature_index], return_index=True)
@@ -750,6 +1218,26 @@ class SparseAdditiveBoostingRegressor(BaseEstimator, RegressorMixin):
         self._explain_shape_functions(X_arr, X_orig, selected)
 
 
+def load_model(path: str, mmap: bool = True) -> AdditiveScorer:
+    r"""Load a model saved with `SparseAdditiveBoostingRegressor.save_model`.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+    mmap : bool, default=True
+        Whether to map the file in memory instead of reading it, so that
+        the processes loading the same model share its memory.
+
+    Returns
+    -------
+    AdditiveScorer
+        The scorer of the model, with the same predictions.
+
+    """
+    return load_scorer(path, mmap=mmap)
+
+
 def __main__(**kwargs) -> None:
     """Run the California housing example."""
     import time
@@ -0,0 +1,104 @@
+"""Implement a compact index of the values of each feature of a matrix."""
+from __future__ import annotations
+
+import attrs
+import numpy as np
+
+
+@attrs.define(slots=True)
+class FeatureIndex:
+    r"""Index of the distinct values of each feature, in CSR layout.
+
+    The sorted distinct values of all the features, and their number of
+    rows, are concatenated: the ones of feature ``j`` are
+    ``values[offsets[j] : offsets[j + 1]]``. The code of each row is the
+    index of its value among the distinct values of the feature, so the rows
+    can be aggregated by value with ``np.bincount(codes[j], ...)``.
+
+    Parameters
+    ----------
+    values : np.ndarray of shape (n_values,)
+        The sorted distinct values of each feature, concatenated.
+    counts : np.ndarray of shape (n_values,)
+        The number of rows of each value.
+    offsets : np.ndarray of shape (n_features + 1,)
+        The offsets of the values of each feature.
+    codes : list of np.ndarray of shape (n_samples,)
+        The code of the value of each row, for each feature. The codes of
+        a column of bin codes in which every bin has rows are the column itself.
+
+    """
+
+    values: np.ndarray = attrs.field()
+    counts: np.ndarray = attrs.field()
+    offsets: np.ndarray = attrs.field()
+    codes: list[np.ndarray] = attrs.field()
+
+    @classmethod
+    def from_matrix(cls, X: np.ndarray) -> FeatureIndex:
+        r"""Index the features of a matrix, one column at a time.
+
+        The columns of unsigned integers, e.g. bin codes, are counted with
+        ``np.bincount`` and their codes are the ranks of their values among
+        the values with rows. The other columns are indexed with ``np.unique``.
+        Only the temporaries of one column are held at a time.
+
+        Parameters
+        ----------
+        X : np.ndarray of shape (n_samples, n_features)
+            The matrix, without missing values, best stored column-major.
+
+        Returns
+        -------
+        FeatureIndex
+            The index, equal to ``np.unique`` of each column with its inverse
+            and counts.
+
+        """
+        n = X.shape[1]
+        value_list, count_list, codes = [], [], []
+        offsets = np.zeros(n + 1, dtype=np.intp)
+        for j in range(n):
+            x = X[:, j]
+            if np.issubdtype(X.dtype, np.unsignedinteger):
+                bin_counts = np.bincount(x)
+                values = np.flatnonzero(bin_counts)
+                counts = bin_counts[values]
+                if len(values) < len(bin_counts):
+                    # Rank of each value among the values with rows
+                    ranks = np.cumsum(bin_counts > 0, dtype=np.intp) - 1
+                    x = ranks.astype(X.dtype)[x]
+                values = values.astype(X.dtype)
+            else:
+                values, inverse, counts = np.unique(
+                    x, return_inverse=True, return_counts=True
+                )
+                x = inverse.astype(np.min_scalar_type(max(len(values) - 1, 0)))
+            value_list.append(values)
+            count_list.append(counts)
+            codes.append(x)
+            offsets[j + 1] = offsets[j] + len(values)
+        return cls(
+            values=np.concatenate(value_list) if n else np.empty(0, dtype=X.dtype),
+            counts=np.concatenate(count_list) if n else np.empty(0, dtype=np.intp),
+            offsets=offsets,
+            codes=codes,
+        )
+
+    def get(self, feature: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        r"""Get the index of a feature.
+
+        Parameters
+        ----------
+        feature : int
+            The index of the feature.
+
+        Returns
+        -------
+        tuple of np.ndarray
+            The sorted distinct values of the feature, the code of each row,
+            and the number of rows of each value.
+
+        """
+        start, end = self.offsets[feature], self.offsets[feature + 1]
+        return self.values[start:end], self.codes[feature], self.counts[start:end]
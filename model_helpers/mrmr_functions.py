@@ -13,7 +13,9 @@ def f_regression_score(X: np.ndarray, y: np.ndarray) -> np.ndarray:
     Parameters
     ----------
     X : np.ndarray
-        The data matrix. It must have 0 mean on each column.
+        The data matrix. It must have 0 mean on each column. It is best stored
+        column-major, as the estimator does, so that the norms and
+        the products with y read each feature contiguously.
     y : np.ndarray
         The target vector.
 
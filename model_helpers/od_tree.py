@@ -2,14 +2,17 @@
 from __future__ import annotations
 
 import math
-from collections import deque
 
 import attrs
 import numpy as np
 from sklearn.metrics import mean_squared_error
 
 from model_helpers.custom_types import Self
+from potts.potts_wrapper import PottsWorkspace
 from potts.potts_wrapper import l2_potts
+from potts.potts_wrapper import l2_potts_batch
+from potts.potts_wrapper import l2_potts_path
+from potts.potts_wrapper import l2_potts_segments
 
 
 # @nb.njit(
@@ -71,6 +74,12 @@ class ListTreeRegressor:
         The L2 regularization parameter.
     l0_fused_regularization : float
         The L0 fused regularization parameter.
+    potts_method : {"dp", "pelt"}
+        The Potts solver to use, "pelt" prunes the candidate splits and is
+        faster when there are many bins, with the same result.
+    workspace : PottsWorkspace, optional
+        Solver buffers reused between fits. If None, they are allocated
+        for each fit.
     bias : float
         A correction term to add to the tree's predictions.
     learning_rate : float
@@ -86,6 +95,13 @@ class ListTreeRegressor:
     ----------
     list_tree_ : ListTree
         The tree represented as a list. It is learnt after fitting.
+    fidelity_ : float
+        The weighted squared error of the tree on the training data.
+    penalty_ : float
+        The L2 penalty of the tree on the training data.
+    table_ : np.ndarray or None
+        The predictions for each bin code of a discretized feature, see
+        `compile_table`. None until compiled.
 
     """
 
@@ -93,6 +109,10 @@ class ListTreeRegressor:
     min_samples_leaf: int = attrs.field(default=1)
     l2_regularization: float = attrs.field(default=0.01)
     l0_fused_regularization: float = attrs.field(default=1.0)
+    potts_method: str = attrs.field(
+        default="dp", validator=attrs.validators.in_(("dp", "pelt"))
+    )
+    workspace: PottsWorkspace | None = attrs.field(default=None, repr=False, eq=False)
     # Correction parameters
     bias: float = attrs.field(default=0.0)
     learning_rate: float = attrs.field(default=1.0)
@@ -101,7 +121,12 @@ class ListTreeRegressor:
     feature_name: str | None = attrs.field(default=None)
     output_name: str | None = attrs.field(default=None)
     # Learnt after fitting
-    list_tree_: ListTree = attrs.field(init=False, repr=False)
+    list_tree_: ListTree | None = attrs.field(init=False, default=None, repr=False)
+    fidelity_: float | None = attrs.field(init=False, default=None, repr=False)
+    penalty_: float | None = attrs.field(init=False, default=None, repr=False)
+    table_: np.ndarray | None = attrs.field(
+        init=False, default=None, repr=False, eq=False
+    )
 
     def fit(
         self,
@@ -133,16 +158,18 @@ class ListTreeRegressor:
 
         """
 
-        self.list_tree_ = ListTree(
-            *l2_potts(
-                X_train,
-                y_train,
-                sample_weight,
-                l2_regularization=self.l2_regularization,
-                l0_fused_regularization=self.l0_fused_regularization,
-                excluded_interval_size=self.min_samples_leaf,
-            )
+        leaves, split_values, self.fidelity_, self.penalty_ = l2_potts(
+            X_train,
+            y_train,
+            sample_weight,
+            l2_regularization=self.l2_regularization,
+            l0_fused_regularization=self.l0_fused_regularization,
+            excluded_interval_size=self.min_samples_leaf,
+            method=self.potts_method,
+            workspace=self.workspace,
+            return_objective=True,
         )
+        self.list_tree_ = ListTree(leaves, split_values)
         return self  # type: ignore
 
     def fix_bias(self, X: np.ndarray) -> float:
@@ -175,6 +202,43 @@ class ListTreeRegressor:
             return self.learning_rate * self.list_tree_(X) - self.bias
         return np.zeros(len(X))
 
+    def compile_table(self, bin_count: int) -> np.ndarray:
+        r"""Compile the predictions for the bin codes of a discretized feature
+        to a lookup table, with the learning rate and the bias folded in.
+
+        The table must be compiled again if the tree, the learning rate or
+        the bias change.
+
+        Parameters
+        ----------
+        bin_count : int
+            The number of bins of the feature.
+
+        Returns
+        -------
+        np.ndarray of shape (bin_count,)
+            The lookup table, which is also stored in `table_`.
+
+        """
+        self.table_ = self.predict(np.arange(bin_count, dtype=np.float32))
+        return self.table_
+
+    def predict_codes(self, codes: np.ndarray) -> np.ndarray:
+        r"""Predict the values of bin codes with the compiled lookup table.
+
+        Parameters
+        ----------
+        codes : np.ndarray
+            The bin codes to predict, as given by the preprocessor.
+
+        Returns
+        -------
+        np.ndarray
+            The predicted values, equal to the ones of `predict`.
+
+        """
+        return self.table_[codes.astype(np.intp)]
+
     def get_mean_absolute_score(self, x: np.ndarray) -> float:
         r"""Compute the mean absolute score of the estimator.
 
@@ -197,24 +261,19 @@ class ListTreeRegressor:
             return len(self.list_tree_.split_values)
         return 0
 
-    def _get_line(
-        self, X: np.ndarray, y: np.ndarray, sample_weight: np.ndarray
-    ) -> tuple[int, float]:
+    def _get_line(self) -> tuple[int, float]:
+        r"""Get the Potts objective of the fitted tree as a line in the L0 fused
+        regularization, from the objective terms returned by the solver."""
         slope = self.get_split_count()
-        leaves = self.list_tree_.leaf_values
-        indexes = np.searchsorted(self.list_tree_.split_values, X, side="right")
-        counts = np.bincount(indexes)
-        penalization = self.l2_regularization * np.square(leaves).dot(counts)
-        fidelity = np.square(leaves[indexes] - y).dot(sample_weight)
-        intercept = fidelity + penalization
-        return slope, intercept  # type: ignore
+        intercept = self.fidelity_ + self.penalty_
+        return slope, intercept
 
 
 @attrs.define(slots=True)
 class ListTreeRegressorCV(ListTreeRegressor):
     r"""A 1D Decision Tree Regressor, represented as a list,
     for faster inference and merging. It is cross-validated, given a range of
-    l0 fused regularization parameters.
+    l0 fused regularization parameters, or given a maximum number of splits.
 
     Parameters
     ----------
@@ -222,6 +281,20 @@ class ListTreeRegressorCV(ListTreeRegressor):
         The minimum L0 fused regularization parameter.
     max_l0_fused_regularization : float
         The maximum L0 fused regularization parameter.
+    max_leaves : int
+        The maximum number of splits of the candidate trees.
+    candidate_trees : {"auto", "path", "bisection", "segments"}
+        If "path", the candidates are the trees on the exact regularization path
+        between the minimum and maximum L0 fused regularization parameters,
+        with at most `max_leaves` splits. If "bisection", they are found by
+        bisecting the L0 fused regularization range until the Potts objectives
+        of the ends of each interval agree within 5%, which solves a few Potts
+        problems instead of the quadratic path. If "segments", the candidates
+        are the best trees for each number of splits up to `max_leaves`,
+        regardless of the L0 fused regularization range. "auto" uses the path
+        up to `max_path_bins` values, and the bisection above.
+    max_path_bins : int
+        The maximum number of values for which "auto" uses the path.
 
     For the other parameters, see `ListTreeRegressor`.
 
@@ -233,6 +306,15 @@ class ListTreeRegressorCV(ListTreeRegressor):
     min_l0_fused_regularization: float = attrs.field(default=0.0)
     max_l0_fused_regularization: float = attrs.field(default=1.0)
     max_leaves = attrs.field(default=10)
+    candidate_trees: str = attrs.field(
+        default="auto",
+        validator=attrs.validators.in_(("auto", "path", "bisection", "segments")),
+    )
+    max_path_bins: int = attrs.field(default=256)
+    potts_method: str = attrs.field(
+        default="dp", validator=attrs.validators.in_(("dp", "pelt"))
+    )
+    workspace: PottsWorkspace | None = attrs.field(default=None, repr=False, eq=False)
     # Correction parameters
     bias: float = attrs.field(default=0.0)
     learning_rate: float = attrs.field(default=1.0)
@@ -241,47 +323,133 @@ class ListTreeRegressorCV(ListTreeRegressor):
     feature_name: str | None = attrs.field(default=None)
     output_name: str | None = attrs.field(default=None)
     # Learnt after fitting
-    list_tree_: ListTree = attrs.field(init=False, repr=False)
+    list_tree_: ListTree | None = attrs.field(init=False, default=None, repr=False)
+    fidelity_: float | None = attrs.field(init=False, default=None, repr=False)
+    penalty_: float | None = attrs.field(init=False, default=None, repr=False)
+    table_: np.ndarray | None = attrs.field(
+        init=False, default=None, repr=False, eq=False
+    )
 
-    def _build_regressors(
+    def _build_segment_regressors(
         self, X: np.ndarray, y: np.ndarray, sample_weight: np.ndarray
     ) -> list[ListTreeRegressor]:
-        left_regressor = ListTreeRegressor(
-            l0_fused_regularization=self.min_l0_fused_regularization,
+        segments = l2_potts_segments(
+            X,
+            y,
+            sample_weight,
+            max_splits=self.max_leaves,
             l2_regularization=self.l2_regularization,
-            min_samples_leaf=self.min_samples_leaf,
+            excluded_interval_size=self.min_samples_leaf,
+            workspace=self.workspace,
+            return_objective=True,
         )
-        left_regressor.fit(X, y, sample_weight)
-        right_regressor = ListTreeRegressor(
-            l0_fused_regularization=self.max_l0_fused_regularization,
+        regressors = []
+        previous_cost = np.inf
+        for leaves, split_values, cost, fidelity, penalty in segments:
+            # The gain of the last split, where the tree ties with the previous one
+            regressor = ListTreeRegressor(
+                l0_fused_regularization=min(
+                    previous_cost - cost, self.max_l0_fused_regularization
+                ),
+                l2_regularization=self.l2_regularization,
+                min_samples_leaf=self.min_samples_leaf,
+                potts_method=self.potts_method,
+            )
+            regressor.list_tree_ = ListTree(leaves, split_values)
+            regressor.fidelity_, regressor.penalty_ = fidelity, penalty
+            regressors.append(regressor)
+            previous_cost = cost
+        return regressors
+
+    def _fit_regressors(
+        self,
+        X: np.ndarray,
+        y: np.ndarray,
+        sample_weight: np.ndarray,
+        l0_fused_regularizations: list[float],
+    ) -> list[ListTreeRegressor]:
+        """Fit a regressor for each l0 fused regularization.
+
+        With the "dp" method, the regularizations are solved together by
+        `l2_potts_batch`, which shares the cumulative moments of the data.
+        """
+        if self.potts_method != "dp":
+            return [
+                ListTreeRegressor(
+                    l0_fused_regularization=l0_fused_regularization,
+                    l2_regularization=self.l2_regularization,
+                    min_samples_leaf=self.min_samples_leaf,
+                    potts_method=self.potts_method,
+                    workspace=self.workspace,
+                ).fit(X, y, sample_weight)
+                for l0_fused_regularization in l0_fused_regularizations
+            ]
+        trees = l2_potts_batch(
+            X,
+            y,
+            sample_weight,
+            l0_fused_regularizations,
             l2_regularization=self.l2_regularization,
-            min_samples_leaf=self.min_samples_leaf,
+            excluded_interval_size=self.min_samples_leaf,
+            workspace=self.workspace,
+            return_objective=True,
+        )
+        regressors = []
+        for l0_fused_regularization, (leaves, split_values, fidelity, penalty) in zip(
+            l0_fused_regularizations, trees
+        ):
+            regressor = ListTreeRegressor(
+                l0_fused_regularization=l0_fused_regularization,
+                l2_regularization=self.l2_regularization,
+                min_samples_leaf=self.min_samples_leaf,
+                potts_method=self.potts_method,
+            )
+            regressor.list_tree_ = ListTree(leaves, split_values)
+            regressor.fidelity_, regressor.penalty_ = fidelity, penalty
+            regressors.append(regressor)
+        return regressors
+
+    def _build_bisection_regressors(
+        self, X: np.ndarray, y: np.ndarray, sample_weight: np.ndarray
+    ) -> list[ListTreeRegressor]:
+        left_regressor, right_regressor = self._fit_regressors(
+            X,
+            y,
+            sample_weight,
+            [self.min_l0_fused_regularization, self.max_l0_fused_regularization],
         )
-        right_regressor.fit(X, y, sample_weight)
-        a_l, b_l = left_regressor._get_line(X, y, sample_weight)
-        a_r, b_r = right_regressor._get_line(X, y, sample_weight)
+        a_l, b_l = left_regressor._get_line()
+        a_r, b_r = right_regressor._get_line()
 
         regressors = []
         if a_l != a_r:
-            queue = deque([(a_l, b_l, a_r, b_r)])
-            while queue:
-                a_l, b_l, a_r, b_r = queue.pop()
-                q = (b_r - b_l) / (a_l - a_r)
-                regressor = ListTreeRegressor(
-                    l0_fused_regularization=q,
-                    l2_regularization=self.l2_regularization,
-                    min_samples_leaf=self.min_samples_leaf,
+            # The intervals are bisected level by level, so that all the
+            # intersections of a level are solved together.
+            # The path of each interval keeps the depth-first order of the results.
+            found = []
+            frontier = [((), a_l, b_l, a_r, b_r)]
+            while frontier:
+                intersections = [
+                    (b_r - b_l) / (a_l - a_r) for _, a_l, b_l, a_r, b_r in frontier
+                ]
+                level_regressors = self._fit_regressors(
+                    X, y, sample_weight, intersections
                 )
-                regressor.fit(X, y, sample_weight)
-                a_q, b_q = regressor._get_line(X, y, sample_weight)
-
-                if math.isclose(q * a_q + b_q, q * a_l + b_l, rel_tol=0.05):
-                    if a_q != a_l and a_q <= self.max_leaves:
-                        regressors.append(regressor)
-                else:
-                    queue.append((a_q, b_q, a_r, b_r))
-                    if a_q <= self.max_leaves:
-                        queue.append((a_l, b_l, a_q, b_q))
+                next_frontier = []
+                for (path, a_l, b_l, a_r, b_r), q, regressor in zip(
+                    frontier, intersections, level_regressors
+                ):
+                    a_q, b_q = regressor._get_line()
+                    if math.isclose(q * a_q + b_q, q * a_l + b_l, rel_tol=0.05):
+                        if a_q != a_l and a_q <= self.max_leaves:
+                            found.append((path, regressor))
+                    else:
+                        if a_q <= self.max_leaves:
+                            next_frontier.append((path + (0,), a_l, b_l, a_q, b_q))
+                        next_frontier.append((path + (1,), a_q, b_q, a_r, b_r))
+                frontier = next_frontier
+            found.sort(key=lambda item: item[0])
+            regressors = [regressor for _, regressor in found]
         cardinality_list = {regressor.get_split_count() for regressor in regressors}
         l_n = left_regressor.get_split_count()
         if l_n <= self.max_leaves and l_n not in cardinality_list:
@@ -290,6 +458,57 @@ class ListTreeRegressorCV(ListTreeRegressor):
             regressors.append(right_regressor)
         return regressors
 
+    def _build_regressors(
+        self, X: np.ndarray, y: np.ndarray, sample_weight: np.ndarray
+    ) -> list[ListTreeRegressor]:
+        candidate_trees = self.candidate_trees
+        if candidate_trees == "auto":
+            candidate_trees = "path" if len(X) <= self.max_path_bins else "bisection"
+        if candidate_trees == "segments":
+            return self._build_segment_regressors(X, y, sample_weight)
+        if candidate_trees == "bisection":
+            return self._build_bisection_regressors(X, y, sample_weight)
+        path = l2_potts_path(
+            X,
+            y,
+            sample_weight,
+            max_splits=self.max_leaves,
+            l2_regularization=self.l2_regularization,
+            excluded_interval_size=self.min_samples_leaf,
+            workspace=self.workspace,
+            return_objective=True,
+        )
+        regressors = []
+        for leaves, split_values, lower, upper, fidelity, penalty in path:
+            lower = max(lower, self.min_l0_fused_regularization)
+            upper = min(upper, self.max_l0_fused_regularization)
+            if lower > upper:
+                continue
+            regressor = ListTreeRegressor(
+                l0_fused_regularization=(lower + upper) / 2,
+                l2_regularization=self.l2_regularization,
+                min_samples_leaf=self.min_samples_leaf,
+                potts_method=self.potts_method,
+            )
+            regressor.list_tree_ = ListTree(leaves, split_values)
+            regressor.fidelity_, regressor.penalty_ = fidelity, penalty
+            regressors.append(regressor)
+        # The path only contains trees with at most max_leaves splits,
+        # the tree at the maximum regularization is kept even if it has more.
+        last_upper = path[-1][3]
+        if last_upper >= self.max_l0_fused_regularization:
+            right_regressor = ListTreeRegressor(
+                l0_fused_regularization=self.max_l0_fused_regularization,
+                l2_regularization=self.l2_regularization,
+                min_samples_leaf=self.min_samples_leaf,
+                potts_method=self.potts_method,
+                workspace=self.workspace,
+            )
+            right_regressor.fit(X, y, sample_weight)
+            if right_regressor.get_split_count() > self.max_leaves:
+                regressors.append(right_regressor)
+        return regressors
+
     def fit(
         self,
         X_train: np.ndarray,
@@ -319,11 +538,11 @@ class ListTreeRegressorCV(ListTreeRegressor):
             mean_squared_error(y_valid, regressor.predict(X_valid))
             for regressor in regressor_list
         ]
-        best_index = np.argmin(score_list)
-        self.list_tree_ = regressor_list[best_index].list_tree_
-        self.l0_fused_regularization = regressor_list[
-            best_index
-        ].l0_fused_regularization
+        best_regressor = regressor_list[np.argmin(score_list)]
+        self.list_tree_ = best_regressor.list_tree_
+        self.fidelity_ = best_regressor.fidelity_
+        self.penalty_ = best_regressor.penalty_
+        self.l0_fused_regularization = best_regressor.l0_fused_regularization
         return self
 
 
@@ -396,6 +615,7 @@ def sum_tree_regressors(
         min_samples_leaf=first_regressor.min_samples_leaf,
         l2_regularization=first_regressor.l2_regularization,
         l0_fused_regularization=first_regressor.l0_fused_regularization,
+        potts_method=first_regressor.potts_method,
         learning_rate=1.0,
         feature_name=feature_name,
         output_name=output_name,
@@ -3,7 +3,7 @@ import contextlib
 
 import attrs
 import numpy as np
-from category_encoders.cat_boost import CatBoostEncoder
+import pandas as pd
 from sklearn.base import BaseEstimator
 from sklearn.base import TransformerMixin
 from sklearn.exceptions import NotFittedError
@@ -53,10 +53,16 @@ class TreePreprocessor(BaseEstimator, TransformerMixin):
     def __attrs_post_init__(self) -> None:
         """Initialize all the preprocessor steps."""
         self._imputer = SimpleImputer(strategy="constant", fill_value=self.fill_value)
-        self._categorical_encoder = CatBoostEncoder(
-            cols=np.where(self.categorical_features)[0].tolist(),
-            random_state=self.random_state,
-        )
+        self._has_categorical_features = len(self.categorical_features) > 0
+        self._categorical_encoder = None
+        if self._has_categorical_features:
+            # category_encoders is slow to import, and only needed here
+            from category_encoders.cat_boost import CatBoostEncoder
+
+            self._categorical_encoder = CatBoostEncoder(
+                cols=np.where(self.categorical_features)[0].tolist(),
+                random_state=self.random_state,
+            )
         self._discretizer = KBinsDiscretizer(
             n_bins=self.max_bins,
             encode="ordinal",
@@ -64,7 +70,7 @@ class TreePreprocessor(BaseEstimator, TransformerMixin):
             dtype=np.float32,
         )
         self._scaler = EmptyTransformer()  # StandardScaler(with_std=False)
-        self._has_categorical_features = len(self.categorical_features) > 0
+        self._feature_maps = None
 
     def fit(self, X: Data, y: Target) -> Self:
         self._numerical_features = np.setdiff1d(
@@ -81,9 +87,19 @@ class TreePreprocessor(BaseEstimator, TransformerMixin):
                 X_[:, self._numerical_features]
             )
         self._scaler.fit(X_)
+        self._feature_maps = None
+        # Without categorical encodings, the output only holds bin codes
+        self._code_dtype = None
+        if self._has_numerical_features and not self._has_categorical_features:
+            self._code_dtype = np.min_scalar_type(
+                max(np.max(self._discretizer.n_bins_) - 1, 0)
+            )
         return self
 
     def transform(self, X: Data) -> np.ndarray:
+        """Transform the data. Without categorical features, the output holds
+        the bin codes in the smallest unsigned integer type, see
+        `get_output_dtype`."""
         X_ = self._imputer.transform(X)
         if self._has_categorical_features:
             X_[:, self.categorical_features] = self._categorical_encoder.transform(
@@ -93,7 +109,129 @@ class TreePreprocessor(BaseEstimator, TransformerMixin):
             X_[:, self._numerical_features] = self._discretizer.transform(
                 X_[:, self._numerical_features]
             )
-        return self._scaler.transform(X_)
+        X_ = self._scaler.transform(X_)
+        if self._code_dtype is not None:
+            return X_.astype(self._code_dtype)
+        return X_
+
+    def get_output_dtype(self) -> np.dtype:
+        """Get the type of the transformed data: uint8 or uint16 bin codes when
+        all the features are discretized, float32 otherwise."""
+        if self._code_dtype is not None:
+            return self._code_dtype
+        return np.dtype(np.float32)
+
+    def transform_features(self, X: Data, features: np.ndarray) -> np.ndarray:
+        """Transform only some features of the data.
+
+        The other columns are neither imputed, encoded nor discretized, so
+        the work done does not depend on them.
+
+        Parameters
+        ----------
+        X : Data of shape (n_samples, n_features)
+            The data to transform.
+        features : np.ndarray of int
+            The indices of the features to transform.
+
+        Returns
+        -------
+        np.ndarray of shape (n_samples, len(features))
+            Equal to ``transform(X)[:, features]`` cast to `get_output_dtype`.
+        """
+        if self._feature_maps is None:
+            self._feature_maps = self._get_feature_maps()
+        if not isinstance(X, pd.DataFrame):
+            X = np.asarray(X)
+        if X.shape[1] != self._imputer.n_features_in_:
+            raise ValueError(
+                f"X has {X.shape[1]} features, but {self.__class__.__name__} "
+                f"is expecting {self._imputer.n_features_in_} features as input."
+            )
+        X_ = X.iloc[:, features] if isinstance(X, pd.DataFrame) else X[:, features]
+        X_ = np.array(X_, dtype=np.float64, order="F")
+        X_[np.isnan(X_)] = self.fill_value
+        # Column-major, as the features are used one at a time
+        Xt = np.empty(X_.shape, dtype=self.get_output_dtype(), order="F")
+        for i, feature in enumerate(features):
+            x = X_[:, i]
+            edges, category_map = self._feature_maps[feature]
+            if edges is not None:
+                Xt[:, i] = np.searchsorted(edges, x.astype(np.float32), side="right")
+            elif category_map is not None:
+                categories, encodings, default = category_map
+                index = np.searchsorted(categories, x).clip(max=len(categories) - 1)
+                Xt[:, i] = np.where(categories[index] == x, encodings[index], default)
+            else:
+                Xt[:, i] = x
+        return Xt
+
+    def _get_feature_maps(self) -> list[tuple]:
+        """Get the bin edges and the category map of each feature."""
+        return list(zip(self.get_bin_edges(), self.get_category_maps()))
+
+    def get_bin_counts(self) -> np.ndarray:
+        """Get the number of bins of each feature after the transformation.
+
+        The transformed numerical features are ordinal bin codes in
+        ``[0, n_bins)``, the categorical features are not discretized and
+        have 0 bins.
+        """
+        bin_counts = np.zeros(self._imputer.n_features_in_, dtype=np.intp)
+        if self._has_numerical_features:
+            bin_counts[self._numerical_features] = self._discretizer.n_bins_
+        return bin_counts
+
+    def get_bin_edges(self) -> list[np.ndarray | None]:
+        """Get the inner bin edges of each feature.
+
+        The bin code of a value ``x`` of a numerical feature is
+        ``np.searchsorted(edges, np.float32(x), side="right")``. The categorical
+        features are not discretized and have no edges.
+        """
+        bin_edges: list[np.ndarray | None] = [None] * self._imputer.n_features_in_
+        if self._has_numerical_features:
+            for feature, edges in zip(
+                self._numerical_features, self._discretizer.bin_edges_
+            ):
+                bin_edges[feature] = edges[1:-1]
+        return bin_edges
+
+    def get_category_maps(
+        self,
+    ) -> list[tuple[np.ndarray, np.ndarray, float] | None]:
+        """Get the encoding of the categories of each encoded feature.
+
+        The sorted categories seen during fit are mapped to their encodings, and
+        any other category to the default encoding. The other features have
+        no map. The encodings are computed by the encoder itself.
+
+        Returns
+        -------
+        list of (categories, encodings, default) or None
+            The map of each feature.
+        """
+        category_maps: list[tuple[np.ndarray, np.ndarray, float] | None] = [
+            None
+        ] * self._imputer.n_features_in_
+        if not self._has_categorical_features:
+            return category_maps
+        n_categorical = len(self.categorical_features)
+        for column, mapping in self._categorical_encoder.mapping.items():
+            categories = np.sort(mapping.index.to_numpy(dtype=np.float64))
+            # One more row with an unseen category, to get the default encoding
+            X_ = np.zeros((len(categories) + 1, n_categorical))
+            X_[:-1, column] = categories
+            X_[-1, column] = np.max(categories, initial=0.0) + 1.0
+            encodings = np.asarray(
+                self._categorical_encoder.transform(X_), dtype=np.float64
+            )[:, column]
+            category_maps[self.categorical_features[column]] = (
+                categories,
+                encodings[:-1],
+                float(encodings[-1]),
+            )
+        return category_maps
 
     def inverse_transform(self, X: Data) -> np.ndarray:
         X_ = self._scaler.inverse_transform(X)
@@ -0,0 +1,262 @@
+"""Implement a compact scorer of fitted additive models, and its file format.
+
+This module only depends on NumPy, so that the scorers can be used without
+the training dependencies.
+"""
+from __future__ import annotations
+
+import json
+import struct
+
+import numpy as np
+
+
+_MAGIC = b"ASBRMODL"
+_FORMAT_VERSION = 1
+_ALIGNMENT = 64
+# The kinds of the features
+BINS = 0
+CATEGORIES = 1
+RAW = 2
+# The arrays of a scorer, concatenated over the selected features
+_ARRAY_NAMES = (
+    "columns",
+    "kinds",
+    "learning_rates",
+    "biases",
+    "default_encodings",
+    "bin_edges",
+    "bin_edge_offsets",
+    "tables",
+    "table_offsets",
+    "categories",
+    "encodings",
+    "category_offsets",
+    "split_values",
+    "split_offsets",
+    "leaf_values",
+    "leaf_offsets",
+)
+# The offsets of the concatenated arrays
+_OFFSETS = {
+    "bin_edges": "bin_edge_offsets",
+    "tables": "table_offsets",
+    "categories": "category_offsets",
+    "encodings": "category_offsets",
+    "split_values": "split_offsets",
+    "leaf_values": "leaf_offsets",
+}
+
+
+def _aligned(size: int) -> int:
+    """Round a size up to the alignment of the arrays."""
+    return -(-size // _ALIGNMENT) * _ALIGNMENT
+
+
+class AdditiveScorer:
+    r"""Score a fitted additive model from flat arrays.
+
+    Each selected feature is imputed with the fill value, then scored in
+    one of three ways, depending on its kind:
+
+    - ``BINS``: the value, as float32, is binned with the bin edges and
+      the bin code looks up the table of the feature.
+    - ``CATEGORIES``: the category is encoded, unseen categories with the
+      default encoding, and the encoding, as float32, is scored by the tree.
+    - ``RAW``: the value, as float32, is scored by the tree.
+
+    The trees are the split and leaf values of the ``ListTree`` of the
+    features, scaled by the learning rate and shifted by the bias.
+    The arrays of all the features are concatenated, the ones of the i-th
+    feature are ``array[offsets[i] : offsets[i + 1]]``.
+
+    Parameters
+    ----------
+    n_features : int
+        The number of features of the data.
+    fill_value : float
+        The value used to fill the missing values.
+    intercept : float
+        The intercept of the model.
+    feature_names : list of str
+        The names of the features.
+    output_name : str
+        The name of the output.
+    arrays : dict of str to np.ndarray
+        The arrays of the selected features, e.g. ``columns`` and ``tables``.
+
+    """
+
+    def __init__(
+        self,
+        n_features: int,
+        fill_value: float,
+        intercept: float,
+        feature_names: list[str],
+        output_name: str,
+        arrays: dict[str, np.ndarray],
+    ) -> None:
+        self.n_features = n_features
+        self.fill_value = fill_value
+        self.intercept = intercept
+        self.feature_names = feature_names
+        self.output_name = output_name
+        self.arrays = arrays
+
+    def get_feature_array(self, name: str, i: int) -> np.ndarray:
+        """Get a concatenated array of the i-th selected feature, e.g.
+        its ``tables``."""
+        offsets = self.arrays[_OFFSETS[name]]
+        return self.arrays[name][offsets[i] : offsets[i + 1]]
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        r"""Predict the response for the data.
+
+        Parameters
+        ----------
+        X : array-like of shape (n_samples, n_features)
+            The data to predict the response for.
+
+        Returns
+        -------
+        np.ndarray of shape (n_samples,)
+            The predicted response, equal to the one of the model.
+
+        """
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(
+                f"X has shape {X.shape}, but the model is expecting "
+                f"{self.n_features} features as input."
+            )
+        arrays = self.arrays
+        X_ = np.array(X[:, arrays["columns"]], dtype=np.float64, order="F")
+        X_[np.isnan(X_)] = self.fill_value
+        prediction = np.zeros(len(X_), dtype=np.float64)
+        for i, kind in enumerate(arrays["kinds"]):
+            x = X_[:, i]
+            if kind == BINS:
+                codes = np.searchsorted(
+                    self.get_feature_array("bin_edges", i),
+                    x.astype(np.float32),
+                    side="right",
+                )
+                prediction += self.get_feature_array("tables", i)[codes]
+                continue
+            if kind == CATEGORIES:
+                categories = self.get_feature_array("categories", i)
+                encodings = self.get_feature_array("encodings", i)
+                index = np.searchsorted(categories, x).clip(max=len(categories) - 1)
+                x = np.where(
+                    categories[index] == x,
+                    encodings[index],
+                    arrays["default_encodings"][i],
+                )
+            leaves = self.get_feature_array("leaf_values", i)[
+                np.searchsorted(
+                    self.get_feature_array("split_values", i),
+                    x.astype(np.float32),
+                    side="right",
+                )
+            ]
+            prediction += arrays["learning_rates"][i] * leaves - arrays["biases"][i]
+        prediction += self.intercept
+        return prediction
+
+    def save(self, path: str) -> None:
+        r"""Save the scorer to a file.
+
+        The file holds a header with the scalars and the layout of the arrays,
+        then the arrays, each aligned to 64 bytes so that they can be mapped
+        in place by `load_scorer`.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file.
+
+        """
+        layout = {}
+        offset = 0
+        for name in _ARRAY_NAMES:
+            array = np.ascontiguousarray(self.arrays[name])
+            layout[name] = {
+                "offset": offset,
+                "shape": list(array.shape),
+                "dtype": array.dtype.str,
+            }
+            offset = _aligned(offset + array.nbytes)
+        header = json.dumps(
+            {
+                "format_version": _FORMAT_VERSION,
+                "n_features": self.n_features,
+                "fill_value": self.fill_value,
+                "intercept": self.intercept,
+                "feature_names": self.feature_names,
+                "output_name": self.output_name,
+                "arrays": layout,
+            }
+        ).encode()
+        prefix_size = len(_MAGIC) + 8
+        header += b" " * (
+            _aligned(prefix_size + len(header)) - prefix_size - len(header)
+        )
+        with open(path, "wb") as file:
+            file.write(_MAGIC)
+            file.write(struct.pack("<Q", len(header)))
+            file.write(header)
+            position = 0
+            for name in _ARRAY_NAMES:
+                file.write(b"\0" * (layout[name]["offset"] - position))
+                data = np.ascontiguousarray(self.arrays[name]).tobytes()
+                file.write(data)
+                position = layout[name]["offset"] + len(data)
+
+
+def load_scorer(path: str, mmap: bool = True) -> AdditiveScorer:
+    r"""Load a scorer saved with `AdditiveScorer.save`.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+    mmap : bool, default=True
+        Whether to map the file in memory instead of reading it. The arrays
+        are then read-only views of the file, shared by all the processes
+        that load it, and loading does not depend on the size of the model.
+
+    Returns
+    -------
+    AdditiveScorer
+        The loaded scorer.
+
+    """
+    if mmap:
+        buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    else:
+        buffer = np.fromfile(path, dtype=np.uint8)
+    prefix_size = len(_MAGIC) + 8
+    if bytes(buffer[: len(_MAGIC)]) != _MAGIC:
+        raise ValueError(f"{path} is not a saved model.")
+    (header_size,) = struct.unpack("<Q", bytes(buffer[len(_MAGIC) : prefix_size]))
+    header = json.loads(bytes(buffer[prefix_size : prefix_size + header_size]))
+    if header["format_version"] != _FORMAT_VERSION:
+        raise ValueError(
+            f"{path} has format version {header['format_version']}, "
+            f"expected {_FORMAT_VERSION}."
+        )
+    data_start = prefix_size + header_size
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        start = data_start + spec["offset"]
+        size = int(np.prod(spec["shape"])) * dtype.itemsize
+        arrays[name] = buffer[start : start + size].view(dtype).reshape(spec["shape"])
+    return AdditiveScorer(
+        n_features=header["n_features"],
+        fill_value=header["fill_value"],
+        intercept=header["intercept"],
+        feature_names=header["feature_names"],
+        output_name=header["output_name"],
+        arrays=arrays,
+    )
@@ -0,0 +1,124 @@
+"""Implement the export of additive scorers to SQL expressions."""
+from __future__ import annotations
+
+import numpy as np
+
+from model_helpers.scorer import BINS
+from model_helpers.scorer import CATEGORIES
+from model_helpers.scorer import AdditiveScorer
+
+
+# The opening and closing quotes of the identifiers of each dialect
+_IDENTIFIER_QUOTES = {
+    "ansi": ('"', '"'),
+    "sqlite": ('"', '"'),
+    "postgres": ('"', '"'),
+    "duckdb": ('"', '"'),
+    "snowflake": ('"', '"'),
+    "mysql": ("`", "`"),
+    "bigquery": ("`", "`"),
+    "tsql": ("[", "]"),
+}
+
+
+def _quote(name: str, dialect: str) -> str:
+    """Quote an identifier, escaping the closing quote."""
+    opening, closing = _IDENTIFIER_QUOTES[dialect]
+    return opening + name.replace(closing, closing * 2) + closing
+
+
+def _literal(value: float) -> str:
+    """Render a float as a SQL literal, which parses back to the same float."""
+    return f"({float(value)!r})" if value < 0 else repr(float(value))
+
+
+def _float32_threshold(edge: float) -> float:
+    """Get the smallest float64 value x such that ``np.float32(x) >= edge``.
+
+    The preprocessing compares the values with the bin edges and the splits
+    as float32, and SQL compares them as float64, so the thresholds are moved
+    to give the same comparisons.
+    """
+    upper = np.float32(edge)
+    if upper < edge:
+        upper = np.nextafter(upper, np.float32(np.inf))
+    lower = np.nextafter(upper, np.float32(-np.inf))
+    middle = (np.float64(lower) + np.float64(upper)) / 2
+    if np.float32(middle) == upper:
+        return float(middle)
+    return float(np.nextafter(middle, np.inf))
+
+
+def _ladder(value: str, edges: np.ndarray, values: np.ndarray) -> str:
+    """Render ``values[np.searchsorted(edges, np.float32(value), "right")]``
+    as a CASE expression, merging the intervals with equal values."""
+    whens = []
+    for edge, left, right in zip(edges, values[:-1], values[1:]):
+        if left != right:
+            threshold = _float32_threshold(edge)
+            whens.append(f"WHEN {value} < {_literal(threshold)} THEN {_literal(left)}")
+    if not whens:
+        return _literal(values[-1])
+    return f"CASE {' '.join(whens)} ELSE {_literal(values[-1])} END"
+
+
+def scorer_to_sql(scorer: AdditiveScorer, dialect: str = "ansi") -> str:
+    r"""Render a scorer as a SQL expression of the raw feature columns.
+
+    Parameters
+    ----------
+    scorer : AdditiveScorer
+        The scorer to render.
+    dialect : str, default="ansi"
+        The SQL dialect, which sets how the columns are quoted. One of "ansi",
+        "sqlite", "postgres", "duckdb", "snowflake", "mysql", "bigquery" and
+        "tsql".
+
+    Returns
+    -------
+    str
+        The expression of the prediction, with one term per selected feature.
+
+    """
+    if dialect not in _IDENTIFIER_QUOTES:
+        raise ValueError(
+            f"Invalid dialect: {dialect}, "
+            f"expected one of {', '.join(_IDENTIFIER_QUOTES)}."
+        )
+    arrays = scorer.arrays
+    terms = []
+    for i, (column, kind) in enumerate(zip(arrays["columns"], arrays["kinds"])):
+        name = _quote(scorer.feature_names[column], dialect)
+        value = f"COALESCE({name}, {_literal(scorer.fill_value)})"
+        if kind == BINS:
+            terms.append(
+                _ladder(
+                    value,
+                    scorer.get_feature_array("bin_edges", i),
+                    scorer.get_feature_array("tables", i),
+                )
+            )
+            continue
+        split_values = scorer.get_feature_array("split_values", i)
+        learning_rate = arrays["learning_rates"][i]
+        bias = arrays["biases"][i]
+        if kind == CATEGORIES:
+            encodings = np.append(
+                scorer.get_feature_array("encodings", i), arrays["default_encodings"][i]
+            )
+            leaves = scorer.get_feature_array("leaf_values", i)[
+                np.searchsorted(split_values, encodings.astype(np.float32), "right")
+            ]
+            predictions = learning_rate * leaves - bias
+            whens = " ".join(
+                f"WHEN {_literal(category)} THEN {_literal(prediction)}"
+                for category, prediction in zip(
+                    scorer.get_feature_array("categories", i), predictions[:-1]
+                )
+            )
+            terms.append(f"CASE {value} {whens} ELSE {_literal(predictions[-1])} END")
+        else:
+            leaves = learning_rate * scorer.get_feature_array("leaf_values", i) - bias
+            terms.append(_ladder(value, split_values, leaves))
+    terms.append(_literal(scorer.intercept))
+    return "\n+ ".join(terms)
@@ -0,0 +1,49 @@
+"""Tests for the index of the feature values."""
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from model_helpers.feature_index import FeatureIndex
+
+
+class TestFeatureIndex(unittest.TestCase):
+    def test_equal_to_unique(self):
+        random_generator = np.random.default_rng(0)
+        X = random_generator.integers(0, 50, (1000, 4)).astype(np.float32)
+        X[:, 1] = random_generator.normal(size=len(X))
+        X[:, 2] = 3.0
+        for index in [
+            FeatureIndex.from_matrix(X),
+            FeatureIndex.from_matrix(np.asfortranarray(X)),
+        ]:
+            for feature in range(X.shape[1]):
+                expected = np.unique(
+                    X[:, feature], return_inverse=True, return_counts=True
+                )
+                for array, expected_array in zip(index.get(feature), expected):
+                    assert_array_equal(array, expected_array)
+
+    def test_bin_codes(self):
+        random_generator = np.random.default_rng(0)
+        X = np.asfortranarray(random_generator.integers(0, 300, (2000, 3)), np.uint16)
+        # A bin without rows, and a column of codes with rows in every bin
+        X[X[:, 0] == 7, 0] = 8
+        X[:, 2] = np.arange(len(X)) % 40
+        index = FeatureIndex.from_matrix(X)
+        for feature in range(X.shape[1]):
+            expected = np.unique(X[:, feature], return_inverse=True, return_counts=True)
+            for array, expected_array in zip(index.get(feature), expected):
+                assert_array_equal(array, expected_array)
+            self.assertEqual(index.get(feature)[1].dtype, np.uint16)
+        self.assertTrue(np.shares_memory(index.get(2)[1], X))
+        self.assertFalse(np.shares_memory(index.get(0)[1], X))
+
+    def test_compact_codes(self):
+        X = np.arange(600, dtype=np.float32).reshape(300, 2)
+        self.assertEqual(FeatureIndex.from_matrix(X).get(0)[1].dtype, np.uint16)
+        self.assertEqual(FeatureIndex.from_matrix(X[:100]).get(1)[1].dtype, np.uint8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,454 @@
+"""Tests for the Potts solvers."""
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from model_helpers.od_tree import ListTreeRegressor
+from model_helpers.od_tree import ListTreeRegressorCV
+from potts import potts_wrapper
+
+
+def generate_signal(random_generator: np.random.Generator, size: int):
+    """Make a noisy step signal with integer weights."""
+    steps = np.repeat(random_generator.normal(size=5), size // 5 + 1)[:size]
+    y = steps + 0.1 * random_generator.normal(size=size)
+    weights = random_generator.integers(1, 5, size=size).astype(np.float64)
+    return y, weights
+
+
+def solve(solver, y, weights, l0_fused_regularization, l2_regularization, excluded):
+    """Run a solver with the C calling convention."""
+    split_indexes = np.empty(y.size, dtype=np.int32)
+    leaves = np.empty(y.size, dtype=np.float64)
+    counter = solver(
+        y,
+        weights,
+        y.size,
+        l0_fused_regularization,
+        l2_regularization,
+        excluded,
+        split_indexes,
+        leaves,
+    )
+    return counter, split_indexes[: counter + 1], leaves[: counter + 1]
+
+
+class TestNumpyPotts(unittest.TestCase):
+    def setUp(self):
+        self.random_generator = np.random.default_rng(42)
+
+    @unittest.skipIf(potts_wrapper.loader is None, "native library not available")
+    def test_matches_native(self):
+        for size in (1, 2, 7, 64, 300):
+            y, weights = generate_signal(self.random_generator, size)
+            for l0_fused_regularization in (0.0, 0.1, 1.0, 100.0):
+                for excluded in (0, 3):
+                    native = solve(
+                        potts_wrapper.loader.l2_potts,
+                        y,
+                        weights,
+                        l0_fused_regularization,
+                        0.6,
+                        excluded,
+                    )
+                    fallback = solve(
+                        potts_wrapper._l2_potts_numpy,
+                        y,
+                        weights,
+                        l0_fused_regularization,
+                        0.6,
+                        excluded,
+                    )
+                    self.assertEqual(native[0], fallback[0])
+                    assert_array_equal(native[1], fallback[1])
+                    assert_array_equal(native[2], fallback[2])
+
+    def test_recovers_steps(self):
+        y = np.repeat([0.0, 5.0, -3.0], 20)
+        weights = np.ones_like(y)
+        counter, split_indexes, leaves = solve(
+            potts_wrapper._l2_potts_numpy, y, weights, 1.0, 0.0, 0
+        )
+        self.assertEqual(counter, 2)
+        assert_array_equal(split_indexes[::-1], [0, 20, 40])
+        assert_array_equal(leaves[::-1], [0.0, 5.0, -3.0])
+
+
+class TestBufferedPotts(unittest.TestCase):
+    @unittest.skipIf(
+        not hasattr(potts_wrapper.loader, "l2_potts_pelt_buffered"),
+        "native buffered solvers not available",
+    )
+    def test_matches_allocating_solvers(self):
+        y, weights = generate_signal(np.random.default_rng(4), 400)
+        for method, allocating, buffered in (
+            ("dp", potts_wrapper.loader.l2_potts, potts_wrapper._l2_potts_solver),
+            (
+                "pelt",
+                potts_wrapper.loader.l2_potts_pelt,
+                potts_wrapper._l2_potts_pelt_solver,
+            ),
+        ):
+            # Stale values in a reused workspace must not change the outputs
+            workspace = potts_wrapper.PottsWorkspace(y.size)
+            workspaces = workspace.double_workspace, workspace.int_workspace
+            for array in workspaces:
+                array.fill(-7)
+            for l0_fused_regularization in (0.0, 0.5, 10.0):
+                expected = solve(
+                    allocating, y, weights, l0_fused_regularization, 0.6, 3
+                )
+                split_indexes = np.empty(y.size, dtype=np.int32)
+                leaves = np.empty(y.size)
+                counter = buffered(
+                    y,
+                    weights,
+                    y.size,
+                    l0_fused_regularization,
+                    0.6,
+                    3,
+                    split_indexes,
+                    leaves,
+                    workspace.objective,
+                    *workspaces,
+                )
+                self.assertEqual(counter, expected[0])
+                assert_array_equal(split_indexes[: counter + 1], expected[1])
+                assert_array_equal(leaves[: counter + 1], expected[2])
+
+    def test_concurrent_fits(self):
+        random_generator = np.random.default_rng(5)
+        signals = [generate_signal(random_generator, 500) for _ in range(8)]
+        x = np.arange(500, dtype=np.float32)
+
+        def fit(signal):
+            y, weights = signal
+            regressor = ListTreeRegressor(
+                l0_fused_regularization=0.5, potts_method="pelt"
+            )
+            return regressor.fit(x, y, weights).list_tree_
+
+        expected = [fit(signal) for signal in signals]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            trees = list(executor.map(fit, signals))
+        for tree, expected_tree in zip(trees, expected):
+            assert_array_equal(tree.leaf_values, expected_tree.leaf_values)
+            assert_array_equal(tree.split_values, expected_tree.split_values)
+
+
+class TestPottsWorkspace(unittest.TestCase):
+    def test_reuse(self):
+        random_generator = np.random.default_rng(8)
+        workspace = potts_wrapper.PottsWorkspace(50, 4)
+        previous = None
+        for size in (50, 20, 120, 7):
+            y, weights = generate_signal(random_generator, size)
+            x = np.arange(size, dtype=np.float32)
+            for weight in (weights, None):
+                for method in ("dp", "pelt"):
+                    expected = potts_wrapper.l2_potts(
+                        x, y, weight, 0.3, 0.6, 2, method=method
+                    )
+                    reused = potts_wrapper.l2_potts(
+                        x, y, weight, 0.3, 0.6, 2, method=method, workspace=workspace
+                    )
+                    assert_array_equal(reused[0], expected[0])
+                    assert_array_equal(reused[1], expected[1])
+                expected_path = potts_wrapper.l2_potts_path(x, y, weight, 6, 0.6, 1)
+                reused_path = potts_wrapper.l2_potts_path(
+                    x, y, weight, 6, 0.6, 1, workspace=workspace
+                )
+                self.assertEqual(len(reused_path), len(expected_path))
+                for reused_tree, expected_tree in zip(reused_path, expected_path):
+                    for reused_item, expected_item in zip(reused_tree, expected_tree):
+                        assert_array_equal(reused_item, expected_item)
+            # The outputs do not share memory with the workspace
+            if previous is not None:
+                assert_array_equal(previous[0], previous_copy)
+            previous = reused
+            previous_copy = reused[0].copy()
+        self.assertGreaterEqual(workspace.capacity, 120)
+        self.assertEqual(workspace.max_splits, 6)
+
+    def test_cross_validation(self):
+        y, weights = generate_signal(np.random.default_rng(9), 100)
+        x = np.arange(y.size, dtype=np.float32)
+        workspace = potts_wrapper.PottsWorkspace()
+        expected = ListTreeRegressorCV(max_leaves=6).fit(x, y, weights, x, y)
+        reused = ListTreeRegressorCV(max_leaves=6, workspace=workspace).fit(
+            x, y, weights, x, y
+        )
+        assert_array_equal(
+            reused.list_tree_.leaf_values, expected.list_tree_.leaf_values
+        )
+        assert_array_equal(
+            reused.list_tree_.split_values, expected.list_tree_.split_values
+        )
+
+
+class TestPottsObjective(unittest.TestCase):
+    def setUp(self):
+        self.y, self.weights = generate_signal(np.random.default_rng(10), 200)
+        self.x = np.arange(self.y.size, dtype=np.float32)
+
+    def test_matches_direct_evaluation(self):
+        for method in ("dp", "pelt"):
+            leaves, split_values, fidelity, penalty = potts_wrapper.l2_potts(
+                self.x,
+                self.y,
+                self.weights,
+                0.4,
+                0.6,
+                2,
+                method=method,
+                return_objective=True,
+            )
+            indexes = np.searchsorted(split_values, self.x, side="right")
+            np.testing.assert_allclose(
+                fidelity, np.square(leaves[indexes] - self.y).dot(self.weights)
+            )
+            np.testing.assert_allclose(
+                penalty, 0.6 * np.square(leaves).dot(np.bincount(indexes))
+            )
+        for tree in potts_wrapper.l2_potts_path(
+            self.x, self.y, self.weights, 8, 0.6, 2, return_objective=True
+        ):
+            leaves, split_values, _, _, fidelity, penalty = tree
+            indexes = np.searchsorted(split_values, self.x, side="right")
+            np.testing.assert_allclose(
+                fidelity, np.square(leaves[indexes] - self.y).dot(self.weights)
+            )
+        for *_, cost, fidelity, penalty in potts_wrapper.l2_potts_segments(
+            self.x, self.y, self.weights, 8, 0.6, 2, return_objective=True
+        ):
+            np.testing.assert_allclose(fidelity + penalty, cost)
+
+    def test_regressor_line(self):
+        regressor = ListTreeRegressor(l0_fused_regularization=0.4).fit(
+            self.x, self.y, self.weights
+        )
+        slope, intercept = regressor._get_line()
+        tree = regressor.list_tree_
+        indexes = np.searchsorted(tree.split_values, self.x, side="right")
+        self.assertEqual(slope, len(tree.split_values))
+        np.testing.assert_allclose(
+            intercept,
+            np.square(tree.leaf_values[indexes] - self.y).dot(self.weights)
+            + regressor.l2_regularization
+            * np.square(tree.leaf_values).dot(np.bincount(indexes)),
+        )
+
+    def test_fallback_matches_native(self):
+        expected = potts_wrapper.l2_potts(
+            self.x, self.y, self.weights, 0.4, 0.6, 2, return_objective=True
+        )
+        objective = np.empty(2)
+        counter, *_ = solve(
+            lambda *arguments: potts_wrapper._l2_potts_numpy(*arguments, objective),
+            self.y,
+            self.weights,
+            0.4,
+            0.6,
+            2,
+        )
+        self.assertEqual(counter, len(expected[1]))
+        assert_array_equal(objective, expected[2:])
+
+
+class TestBatchPotts(unittest.TestCase):
+    def test_matches_single_solves(self):
+        y, weights = generate_signal(np.random.default_rng(0), 200)
+        x = np.arange(y.size, dtype=np.float32)
+        l0_fused_regularizations = [0.0, 0.3, 1.0, 5.0, 50.0]
+        batch = potts_wrapper.l2_potts_batch(
+            x,
+            y,
+            weights,
+            l0_fused_regularizations,
+            0.6,
+            3,
+            workspace=potts_wrapper.PottsWorkspace(),
+            return_objective=True,
+        )
+        self.assertEqual(len(batch), len(l0_fused_regularizations))
+        for l0_fused_regularization, tree in zip(l0_fused_regularizations, batch):
+            expected = potts_wrapper.l2_potts(
+                x, y, weights, l0_fused_regularization, 0.6, 3, return_objective=True
+            )
+            assert_array_equal(tree[0], expected[0])
+            assert_array_equal(tree[1], expected[1])
+            self.assertEqual(tree[2:], expected[2:])
+
+    def test_threads(self):
+        y, weights = generate_signal(np.random.default_rng(6), 300)
+        x = np.arange(y.size, dtype=np.float32)
+        l0_fused_regularizations = np.linspace(0.0, 5.0, 7)
+        expected = potts_wrapper.l2_potts_batch(
+            x, y, weights, l0_fused_regularizations, 0.6, 2
+        )
+        threaded = potts_wrapper.l2_potts_batch(
+            x, y, weights, l0_fused_regularizations, 0.6, 2, n_jobs=3
+        )
+        for (leaves, split_values), (expected_leaves, expected_split_values) in zip(
+            threaded, expected
+        ):
+            assert_array_equal(leaves, expected_leaves)
+            assert_array_equal(split_values, expected_split_values)
+
+
+class TestPeltPotts(unittest.TestCase):
+    def test_matches_dynamic_program(self):
+        random_generator = np.random.default_rng(7)
+        for size in (1, 10, 500, 3000):
+            y, weights = generate_signal(random_generator, size)
+            x = np.arange(size, dtype=np.float32)
+            for l0_fused_regularization in (0.0, 0.5, 10.0):
+                for excluded in (0, 8):
+                    expected = potts_wrapper.l2_potts(
+                        x, y, weights, l0_fused_regularization, 0.6, excluded
+                    )
+                    pruned = potts_wrapper.l2_potts(
+                        x,
+                        y,
+                        weights,
+                        l0_fused_regularization,
+                        0.6,
+                        excluded,
+                        method="pelt",
+                    )
+                    assert_array_equal(pruned[0], expected[0])
+                    assert_array_equal(pruned[1], expected[1])
+
+    def test_invalid_method(self):
+        with self.assertRaises(ValueError):
+            potts_wrapper.l2_potts(np.arange(3.0), np.arange(3.0), method="fpop")
+
+
+class TestPottsPath(unittest.TestCase):
+    def setUp(self):
+        self.y, self.weights = generate_signal(np.random.default_rng(1), 150)
+        self.x = np.arange(self.y.size, dtype=np.float32)
+
+    def test_matches_potts_on_each_interval(self):
+        max_splits = 8
+        path = potts_wrapper.l2_potts_path(
+            self.x, self.y, self.weights, max_splits, 0.6, 2
+        )
+        split_counts = [len(split_values) for _, split_values, _, _ in path]
+        self.assertEqual(split_counts, sorted(split_counts))
+        self.assertEqual(path[0][3], np.inf)
+        for leaves, split_values, lower, upper in path:
+            self.assertLessEqual(lower, upper)
+            upper = min(upper, 2 * lower + 10.0)
+            expected_leaves, expected_split_values = potts_wrapper.l2_potts(
+                self.x, self.y, self.weights, (lower + upper) / 2, 0.6, 2
+            )
+            if len(expected_split_values) > max_splits:
+                continue
+            assert_array_equal(split_values, expected_split_values)
+            np.testing.assert_allclose(leaves, expected_leaves)
+
+    @unittest.skipIf(potts_wrapper.loader is None, "native library not available")
+    def test_numpy_matches_native(self):
+        outputs = []
+        workspace = potts_wrapper.PottsWorkspace(self.y.size, 10)
+        for solver in (
+            potts_wrapper._l2_potts_segments_solver,
+            potts_wrapper._l2_potts_segments_numpy,
+        ):
+            costs = np.empty(11)
+            split_indexes = np.zeros((11, 11), dtype=np.int32)
+            leaves = np.zeros((11, 11))
+            objectives = np.zeros((11, 2))
+            solver(
+                self.y,
+                self.weights,
+                self.y.size,
+                10,
+                0.6,
+                3,
+                costs,
+                split_indexes,
+                leaves,
+                objectives,
+                workspace.double_workspace,
+                workspace.int_workspace,
+            )
+            outputs.append((costs, split_indexes, leaves, objectives))
+        (native_costs, *native), (numpy_costs, *fallback) = outputs
+        assert_array_equal(native_costs, numpy_costs)
+        for k in np.flatnonzero(np.isfinite(native_costs)):
+            for native_array, numpy_array in zip(native[:2], fallback[:2]):
+                assert_array_equal(native_array[k, : k + 1], numpy_array[k, : k + 1])
+            assert_array_equal(native[2][k], fallback[2][k])
+
+
+class TestPottsSegments(unittest.TestCase):
+    def test_best_tree_for_each_split_count(self):
+        y, weights = generate_signal(np.random.default_rng(2), 120)
+        x = np.arange(y.size, dtype=np.float32)
+        segments = potts_wrapper.l2_potts_segments(x, y, weights, 12, 0.6, 2)
+        self.assertEqual(
+            [len(split_values) for _, split_values, _ in segments], list(range(13))
+        )
+        costs = np.array([cost for _, _, cost in segments])
+        self.assertTrue(np.all(np.diff(costs) <= 0.0))
+        path = potts_wrapper.l2_potts_path(x, y, weights, 12, 0.6, 2)
+        for leaves, split_values, _, _ in path:
+            segment_leaves, segment_split_values, _ = segments[len(split_values)]
+            assert_array_equal(leaves, segment_leaves)
+            assert_array_equal(split_values, segment_split_values)
+
+    def test_bisection_candidates_on_path(self):
+        y, weights = generate_signal(np.random.default_rng(4), 300)
+        x = np.arange(y.size, dtype=np.float32)
+        path = {
+            len(split_values): (leaves, split_values)
+            for leaves, split_values, *_ in potts_wrapper.l2_potts_path(
+                x, y, weights, 6, 0.6, 1
+            )
+        }
+        regressor = ListTreeRegressorCV(
+            max_leaves=6,
+            l2_regularization=0.6,
+            min_l0_fused_regularization=0.1,
+            max_l0_fused_regularization=500.0,
+        )
+        for method in ("dp", "pelt"):
+            regressor.potts_method = method
+            regressor.candidate_trees = "bisection"
+            candidates = regressor._build_regressors(x, y, weights)
+            self.assertGreater(len(candidates), 1)
+            for candidate in candidates:
+                leaves, split_values = path[candidate.get_split_count()]
+                assert_array_equal(candidate.list_tree_.leaf_values, leaves)
+                assert_array_equal(candidate.list_tree_.split_values, split_values)
+            # "auto" only solves the path for short signals
+            regressor.candidate_trees = "auto"
+            for max_path_bins, expected in [(x.size, path), (x.size - 1, candidates)]:
+                regressor.max_path_bins = max_path_bins
+                self.assertEqual(
+                    len(regressor._build_regressors(x, y, weights)), len(expected)
+                )
+
+    def test_unreachable_split_counts(self):
+        y = np.arange(10.0)
+        segments = potts_wrapper.l2_potts_segments(y, y, None, 8, 0.0, 3)
+        self.assertEqual(len(segments), 3)
+
+    def test_cross_validation_candidates(self):
+        y, weights = generate_signal(np.random.default_rng(3), 100)
+        x = np.arange(y.size, dtype=np.float32)
+        regressor = ListTreeRegressorCV(max_leaves=6, candidate_trees="segments")
+        candidates = regressor._build_regressors(x, y, weights)
+        self.assertEqual(
+            [candidate.get_split_count() for candidate in candidates], list(range(7))
+        )
+        regressor.fit(x, y, weights, x, y)
+        self.assertLessEqual(regressor.get_split_count(), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,14 @@
 """Tests for the models to be proper sklearn estimators."""
+import os
+import pickle
+import sqlite3
+import subprocess
+import sys
+import tempfile
 import unittest
 
+import numpy as np
+import pandas as pd
 from numpy.testing import assert_array_equal
 from sklearn.base import clone
 from sklearn.datasets import make_regression
@@ -9,7 +17,9 @@ from sklearn.model_selection import GridSearchCV
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 
+import asboostreg
 from asboostreg import SparseAdditiveBoostingRegressor
+from asboostreg import load_model
 
 
 R2_THRESHOLD = 0.5
@@ -27,6 +37,16 @@ def generate_data():
     )
 
 
+def generate_categorical_data():
+    """Make a regression dataset with categorical and missing values."""
+    X, y = generate_data()
+    rng = np.random.default_rng(0)
+    X[:, :2] = rng.integers(0, 5, (len(X), 2))
+    y = y + 50 * (X[:, 0] == 2) + 50 * (X[:, 1] % 3)
+    X[rng.random(X.shape) < 0.05] = np.nan
+    return X, y
+
+
 class TestSparseAdditiveBoostingRegressor(unittest.TestCase):
     def setUp(self):
         self.X, self.y = generate_data()
@@ -82,6 +102,260 @@ class TestSparseAdditiveBoostingRegressor(unittest.TestCase):
         )
         grid_search.fit(self.X, self.y)
 
+    def test_lookup_tables(self):
+        self.regressor.fit(self.X, self.y)
+        X_arr = self.regressor.preprocessor_.transform(self.X).astype(np.float32)
+        expected = self.regressor.intercept_ + np.sum(
+            [
+                regressor.predict(X_arr[:, i])
+                for i, regressor in enumerate(self.regressor.regressors_)
+                if regressor.is_selected
+            ],
+            axis=0,
+        )
+        for regressor in self.regressor.regressors_:
+            self.assertIsNotNone(regressor.table_)
+            if regressor.is_selected:
+                self.assertTrue(
+                    np.shares_memory(regressor.table_, self.regressor._lookup_table)
+                )
+        assert_array_equal(self.regressor.predict(self.X), expected)
+
+    def test_chunked_predict(self):
+        self.regressor.fit(self.X, self.y)
+        expected = self.regressor.predict(self.X)
+        assert_array_equal(self.regressor.predict(self.X, chunk_size=777), expected)
+        assert_array_equal(
+            np.concatenate(list(self.regressor.predict_iter(self.X, chunk_size=5000))),
+            expected,
+        )
+        frame = pd.DataFrame(self.X)
+        chunks = (
+            frame.iloc[start : start + 3000] for start in range(0, len(frame), 3000)
+        )
+        assert_array_equal(self.regressor.predict(chunks), expected)
+        for chunk_size in [0, -1]:
+            with self.assertRaisesRegex(ValueError, "chunk_size"):
+                self.regressor.predict(self.X, chunk_size=chunk_size)
+            with self.assertRaisesRegex(ValueError, "chunk_size"):
+                self.regressor.predict_iter(self.X, chunk_size=chunk_size)
+
+    def test_parallel_predict(self):
+        self.regressor.fit(self.X, self.y)
+        expected = self.regressor.predict(self.X)
+        assert_array_equal(self.regressor.predict(self.X, n_jobs=4), expected)
+        assert_array_equal(
+            self.regressor.predict(pd.DataFrame(self.X), chunk_size=1000, n_jobs=-1),
+            expected,
+        )
+        self.regressor.n_jobs = 3
+        assert_array_equal(self.regressor.predict(self.X), expected)
+
+    def test_bin_codes(self):
+        self.regressor = SparseAdditiveBoostingRegressor(random_state=0)
+        self.regressor.fit(self.X, self.y)
+        preprocessor = self.regressor.preprocessor_
+        self.assertEqual(preprocessor.transform(self.X).dtype, np.uint16)
+        regressor = SparseAdditiveBoostingRegressor(max_bins=256, random_state=0)
+        regressor.fit(self.X, self.y)
+        X_codes = regressor.preprocessor_.transform(self.X)
+        self.assertEqual(X_codes.dtype, np.uint8)
+        assert_array_equal(
+            regressor.preprocessor_.transform_features(self.X, np.arange(3)),
+            X_codes[:, :3],
+        )
+        self.assertGreaterEqual(
+            r2_score(self.y, regressor.predict(self.X)), R2_THRESHOLD
+        )
+        X, y = generate_categorical_data()
+        regressor = SparseAdditiveBoostingRegressor(
+            categorical_features=[0, 1], random_state=0
+        )
+        regressor.fit(X, y)
+        self.assertEqual(regressor.preprocessor_.get_output_dtype(), np.float32)
+
+    def test_potts_methods(self):
+        # The features have more values than the path is used for
+        predictions = [
+            SparseAdditiveBoostingRegressor(
+                max_bins=1024, potts_method=potts_method, random_state=0
+            )
+            .fit(self.X, self.y)
+            .predict(self.X)
+            for potts_method in ("auto", "dp", "pelt")
+        ]
+        # The solvers find the same trees
+        assert_array_equal(predictions[0], predictions[1])
+        assert_array_equal(predictions[0], predictions[2])
+        self.assertGreaterEqual(r2_score(self.y, predictions[0]), R2_THRESHOLD)
+        with self.assertRaises(ValueError):
+            SparseAdditiveBoostingRegressor(candidate_trees="exact")
+
+    def test_predict_one(self):
+        X, y = generate_categorical_data()
+        self.regressor = SparseAdditiveBoostingRegressor(
+            categorical_features=[0, 1], random_state=0
+        )
+        self.regressor.fit(X, y)
+        rows = X[:200]
+        expected = self.regressor.predict(rows)
+        predictions = [self.regressor.predict_one(row) for row in rows.tolist()]
+        assert_array_equal(predictions, expected)
+        records = [
+            {
+                name: x
+                for name, x in zip(self.regressor.feature_names_in_, row)
+                if x == x
+            }
+            for row in rows
+        ]
+        assert_array_equal(self.regressor.predict_records(records), expected)
+        # Values next to the bin edges, which are compared as float32
+        regressor = SparseAdditiveBoostingRegressor(random_state=0)
+        regressor.fit(self.X, self.y)
+        bin_edges = regressor.preprocessor_.get_bin_edges()
+        for feature in regressor._selected_features:
+            edges = bin_edges[feature].astype(np.float64)
+            values = np.concatenate(
+                [
+                    edges,
+                    np.nextafter(edges, -np.inf),
+                    np.nextafter(edges, np.inf),
+                    np.nextafter(edges.astype(np.float32), -np.inf) / 2 + edges / 2,
+                ]
+            )
+            rows = np.repeat(self.X[:1], len(values), axis=0)
+            rows[:, feature] = values
+            assert_array_equal(
+                [regressor.predict_one(row) for row in rows.tolist()],
+                regressor.predict(rows),
+            )
+
+    def test_transform_selected_features(self):
+        X, y = generate_categorical_data()
+        self.regressor = SparseAdditiveBoostingRegressor(
+            categorical_features=[0, 1], random_state=0
+        )
+        self.regressor.fit(X, y)
+        preprocessor = self.regressor.preprocessor_
+        features = np.array([3, 0, 1, 7])
+        assert_array_equal(
+            preprocessor.transform_features(pd.DataFrame(X), features),
+            preprocessor.transform(X)[:, features].astype(np.float32),
+        )
+        contribution = self.regressor.contribution_frame(X).to_numpy()
+        assert_array_equal(
+            contribution.sum(axis=1) + self.regressor.intercept_,
+            self.regressor.predict(X),
+        )
+
+    def test_single_function(self):
+        self.regressor = SparseAdditiveBoostingRegressor(n_estimators=1)
+        with self.assertWarns(UserWarning):
+            self.regressor.fit(self.X, self.y)
+        self.assertEqual(len(self.regressor.regressors_), self.X.shape[1])
+        contribution = self.regressor.contribution_frame(self.X)
+        self.assertEqual(contribution.shape, self.X.shape)
+        assert_array_equal(
+            contribution.to_numpy().sum(axis=1) + self.regressor.intercept_,
+            self.regressor.predict(self.X),
+        )
+        scorer = self.regressor.export_scorer()
+        self.assertEqual(scorer.n_features, self.X.shape[1])
+        assert_array_equal(scorer.predict(self.X), self.regressor.predict(self.X))
+
+    def test_pickle(self):
+        self.regressor.fit(self.X, self.y)
+        self.assertIsNone(self.regressor._prediction_cache)
+        loaded = pickle.loads(pickle.dumps(self.regressor))
+        assert_array_equal(loaded.predict(self.X), self.regressor.predict(self.X))
+        feature = loaded._selected_features[0]
+        self.assertTrue(
+            np.shares_memory(loaded.regressors_[feature].table_, loaded._lookup_table)
+        )
+        regressor = SparseAdditiveBoostingRegressor(keep_training_state=True)
+        regressor.fit(self.X, self.y)
+        self.assertIsNotNone(regressor._prediction_cache)
+        self.assertIsNone(pickle.loads(pickle.dumps(regressor))._prediction_cache)
+
+    def test_save_model(self):
+        X, y = generate_categorical_data()
+        categorical_regressor = SparseAdditiveBoostingRegressor(
+            categorical_features=[0, 1], random_state=0
+        )
+        categorical_regressor.fit(X, y)
+        self.regressor.fit(self.X, self.y)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "model.bin")
+            for regressor, X in [(self.regressor, self.X), (categorical_regressor, X)]:
+                regressor.save_model(path)
+                for mmap in (True, False):
+                    scorer = load_model(path, mmap=mmap)
+                    self.assertEqual(
+                        isinstance(scorer.arrays["columns"], np.memmap), mmap
+                    )
+                    assert_array_equal(scorer.predict(X), regressor.predict(X))
+                del scorer
+
+    def test_export_scorer(self):
+        self.regressor.fit(self.X, self.y)
+        scorer = self.regressor.export_scorer()
+        assert_array_equal(scorer.predict(self.X), self.regressor.predict(self.X))
+        # Score in a process where the training dependencies cannot be imported
+        script = (
+            "import pickle, sys\n"
+            "for name in ('sklearn', 'pandas', 'shap', 'plotly', 'category_encoders'):\n"
+            "    sys.modules[name] = None\n"
+            "scorer, X = pickle.load(sys.stdin.buffer)\n"
+            "pickle.dump(scorer.predict(X), sys.stdout.buffer)\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            input=pickle.dumps((scorer, self.X)),
+            capture_output=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(asboostreg.__file__)),
+        )
+        assert_array_equal(pickle.loads(result.stdout), self.regressor.predict(self.X))
+
+    def test_to_sql(self):
+        X, y = generate_categorical_data()
+        categorical_regressor = SparseAdditiveBoostingRegressor(
+            categorical_features=[0, 1], random_state=0
+        )
+        categorical_regressor.fit(X, y)
+        self.regressor.fit(self.X, self.y)
+        for regressor, X in [(self.regressor, self.X), (categorical_regressor, X)]:
+            connection = sqlite3.connect(":memory:")
+            columns = ", ".join(
+                f'"{name}" REAL' for name in regressor.feature_names_in_
+            )
+            connection.execute(f"CREATE TABLE data ({columns})")
+            connection.executemany(
+                f"INSERT INTO data VALUES ({', '.join('?' * X.shape[1])})",
+                [[None if np.isnan(x) else x for x in row] for row in X.tolist()],
+            )
+            query = f"SELECT {regressor.to_sql('sqlite')} FROM data ORDER BY rowid"
+            predictions = [row[0] for row in connection.execute(query)]
+            connection.close()
+            assert_array_equal(predictions, regressor.predict(X))
+
+
+class TestImports(unittest.TestCase):
+    def test_lazy_imports(self):
+        script = "import sys\nimport asboostreg\nprint(*sorted(sys.modules))\n"
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(asboostreg.__file__)),
+        )
+        modules = result.stdout.split()
+        # Only needed to explain the model or to encode categorical features
+        for module in ("shap", "plotly", "category_encoders"):
+            self.assertNotIn(module, modules)
+
 
 if __name__ == "__main__":
     unittest.main()
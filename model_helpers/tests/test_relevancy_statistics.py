@@ -0,0 +1,32 @@
+"""Tests for the sufficient statistics of the f_regression score."""
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from model_helpers.feature_index import FeatureIndex
+from model_helpers.mrmr_functions import f_regression_score
+from model_helpers.relevancy_statistics import FRegressionStatistics
+
+
+class TestFRegressionStatistics(unittest.TestCase):
+    def test_equal_to_f_regression_score(self):
+        random_generator = np.random.default_rng(0)
+        X = np.asfortranarray(random_generator.integers(0, 20, (2000, 6)), np.uint8)
+        X[:, 3] = 0
+        y = X[:, 0] * 0.5 - X[:, 1] + random_generator.normal(size=len(X))
+        y -= y.mean()
+        feature_index = FeatureIndex.from_matrix(X)
+        statistics = FRegressionStatistics.from_residual(X, y, feature_index)
+        assert_allclose(statistics.score(y), f_regression_score(X, y), rtol=1e-10)
+        for feature in [0, 1, 0, 4, 3]:
+            values, codes, _ = feature_index.get(feature)
+            steps = random_generator.normal(size=len(values))
+            y -= steps[codes]
+            statistics.update(feature, steps)
+            assert_allclose(statistics.score(y), f_regression_score(X, y), rtol=1e-10)
+        self.assertEqual(sorted(statistics.bin_sums), [0, 1, 3, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,166 @@
+#include <math.h>
 #include <stdlib.h>
 
+#ifdef _WIN32
+#define POTTS_EXPORT __declspec(dllexport)
+#else
+#define POTTS_EXPORT __attribute__((visibility("default")))
+#endif
+
+/**
+ * @brief Calculate the cumulative moments of the weighted data.
+ *
+ * The arrays have length data_length + 1, and start with a zero, so that
+ * the moments of the interval [left, right) are the difference of the
+ * entries at right and left.
+ *
+ * @param input_data The input data array.
+ * @param weights The array of weights associated with input_data.
+ * @param data_length The length of input_data and weights arrays.
+ * @param cumulative_first_moments Output array of weighted sums.
+ * @param cumulative_second_moments Output array of weighted sums of squares.
+ * @param cumulative_weights Output array of sums of weights.
+ */
+static void cumulative_moments(
+    const double* input_data,
+    const double* weights,
+    const int data_length,
+    double* cumulative_first_moments,
+    double* cumulative_second_moments,
+    double* cumulative_weights
+){
+    cumulative_first_moments[0] = 0.0;
+    cumulative_second_moments[0] = 0.0;
+    cumulative_weights[0] = 0.0;
+
+    double weight, weighted_data;
+    for (int j = 0; j < data_length; j++){
+        weight = weights[j];
+        weighted_data = weight*input_data[j];
+        cumulative_first_moments[j + 1] = cumulative_first_moments[j] + weighted_data;
+        cumulative_second_moments[j + 1] = cumulative_second_moments[j] + weighted_data*input_data[j];
+        cumulative_weights[j + 1] = cumulative_weights[j] + weight;
+    }
+}
+
+/**
+ * @brief Recover the partition of a Potts solution from its jumps.
+ *
+ * @param cumulative_first_moments The weighted sums, see cumulative_moments.
+ * @param cumulative_weights The sums of weights.
+ * @param data_length The length of the data.
+ * @param l2_regularization The L2 regularization parameter.
+ * @param jumps The start of the last interval of the solution of each prefix.
+ * @param split_indexes Output array to store split indexes.
+ * @param leaves Output array to store the piecewise constant values.
+ * @param objective Output array of length 2 to store the weighted squared error
+ * and the L2 penalty of the approximation, or NULL.
+ * @return The number of leaves in the piecewise approximation.
+ */
+static int potts_backtrack(
+    const double* cumulative_first_moments,
+    const double* cumulative_second_moments,
+    const double* cumulative_weights,
+    const int data_length,
+    const double l2_regularization,
+    const int* jumps,
+    int* split_indexes,
+    double* leaves,
+    double* objective
+){
+    int right = data_length;
+    int left = jumps[data_length - 1];
+    double mean, first_moments, penalty;
+    double total_fidelity = 0.0, total_penalty = 0.0;
+    int leave_count = 0;
+    while (right > 0){
+        first_moments = cumulative_first_moments[right] - cumulative_first_moments[left];
+        mean = first_moments/
+            (cumulative_weights[right] - cumulative_weights[left] + l2_regularization*
+            (right - left));
+        leaves[leave_count] = mean;
+        split_indexes[leave_count] = left;
+        // The ridge cost of the interval is its squared error plus its penalty
+        penalty = l2_regularization*(right - left)*mean*mean;
+        total_fidelity += cumulative_second_moments[right] -
+            cumulative_second_moments[left] - mean*first_moments - penalty;
+        total_penalty += penalty;
+        right = left;
+        if (right < 1){
+            break;
+        }
+        left = jumps[right - 1];
+        leave_count++;
+    }
+    if (objective != NULL){
+        objective[0] = total_fidelity;
+        objective[1] = total_penalty;
+    }
+    return leave_count;
+}
+
+/**
+ * @brief Solve the Potts problem given the cumulative moments of the data.
+ *
+ * @param cumulative_first_moments The weighted sums, see cumulative_moments.
+ * @param cumulative_second_moments The weighted sums of squares.
+ * @param cumulative_weights The sums of weights.
+ * @param data_length The length of the data.
+ * @param l0_fused_regularization The L0 fused regularization parameter.
+ * @param l2_regularization The L2 regularization parameter.
+ * @param excluded_interval_size The maximum interval size to exclude.
+ * @param jumps Workspace array of length data_length.
+ * @param potts_values Workspace array of length data_length.
+ * @param split_indexes Output array to store split indexes.
+ * @param leaves Output array to store the piecewise constant values.
+ * @param objective Output array for the objective, see potts_backtrack.
+ * @return The number of leaves in the piecewise approximation.
+ */
+static int potts_partition(
+    const double* cumulative_first_moments,
+    const double* cumulative_second_moments,
+    const double* cumulative_weights,
+    const int data_length,
+    const double l0_fused_regularization,
+    const double l2_regularization,
+    const int excluded_interval_size,
+    int* jumps,
+    double* potts_values,
+    int* split_indexes,
+    double* leaves,
+    double* objective
+){
+    double deviation, candidate, first_moments, first_moments_difference;
+    for (int right = 1; right <= data_length; right++){
+        first_moments = cumulative_first_moments[right];
+        potts_values[right - 1] = cumulative_second_moments[right] -
+        first_moments*first_moments/(cumulative_weights[right] + l2_regularization*right);
+        jumps[right - 1] = 0;
+
+        for (int left = right - excluded_interval_size - 1; left >= 1; left--){
+            first_moments_difference = first_moments - cumulative_first_moments[left];
+            deviation = l0_fused_regularization +
+                cumulative_second_moments[right] - cumulative_second_moments[left] -
+                first_moments_difference*first_moments_difference/
+                (cumulative_weights[right] - cumulative_weights[left] +
+                l2_regularization*(right - left));
+            if (deviation > potts_values[right - 1]){
+                break;
+            }
+            candidate = potts_values[left - 1] + deviation;
+            if (candidate < potts_values[right - 1]){
+                potts_values[right - 1] = candidate;
+                jumps[right - 1] = left;
+            }
+        }
+    }
+
+    return potts_backtrack(
+        cumulative_first_moments, cumulative_second_moments, cumulative_weights,
+        data_length, l2_regularization, jumps, split_indexes, leaves, objective
+    );
+}
+
 /**
  * @brief Calculate piecewise constant approximations using Potts regularization.
  *
@@ -7,6 +168,9 @@
  * Potts regularization. It returns the number of leaves in the piecewise
  * approximation.
  *
+ * It does not allocate memory, and only writes to the given outputs and
+ * workspaces, so concurrent calls with distinct buffers are thread-safe.
+ *
  * @param input_data The input data array.
  * @param weights The array of weights associated with input_data.
  * @param data_length The length of input_data and weights arrays.
@@ -15,9 +179,59 @@
  * @param excluded_interval_size The maximum interval size to exclude.
  * @param split_indexes Output array to store split indexes.
  * @param leaves Output array to store the piecewise constant values.
+ * @param objective Output array of length 2 to store the weighted squared error
+ * and the L2 penalty of the approximation.
+ * @param double_workspace Workspace array of length 4*data_length + 3.
+ * @param int_workspace Workspace array of length data_length.
  * @return The number of leaves in the piecewise approximation.
  */
-__declspec(dllexport) int l2_potts(
+POTTS_EXPORT int l2_potts_buffered(
+    double* input_data,
+    double* weights,
+    const int data_length,
+    const double l0_fused_regularization,
+    const double l2_regularization,
+    const int excluded_interval_size,
+    int* split_indexes,
+    double* leaves,
+    double* objective,
+    double* double_workspace,
+    int* int_workspace
+){
+    double* cumulative_first_moments = double_workspace;
+    double* cumulative_second_moments = cumulative_first_moments + data_length + 1;
+    double* cumulative_weights = cumulative_second_moments + data_length + 1;
+    double* potts_values = cumulative_weights + data_length + 1;
+    int* jumps = int_workspace;
+
+    cumulative_moments(
+        input_data, weights, data_length,
+        cumulative_first_moments, cumulative_second_moments, cumulative_weights
+    );
+    return potts_partition(
+        cumulative_first_moments, cumulative_second_moments, cumulative_weights,
+        data_length, l0_fused_regularization, l2_regularization,
+        excluded_interval_size, jumps, potts_values, split_indexes, leaves,
+        objective
+    );
+}
+
+/**
+ * @brief Calculate piecewise constant approximations using Potts regularization.
+ *
+ * Same as l2_potts_buffered, allocating the workspaces.
+ *
+ * @param input_data The input data array.
+ * @param weights The array of weights associated with input_data.
+ * @param data_length The length of input_data and weights arrays.
+ * @param l0_fused_regularization The L0 fused regularization parameter.
+ * @param l2_regularization The L2 regularization parameter.
+ * @param excluded_interval_size The maximum interval size to exclude.
+ * @param split_indexes Output array to store split indexes.
+ * @param leaves Output array to store the piecewise constant values.
+ * @return The number of leaves in the piecewise approximation.
+ */
+POTTS_EXPORT int l2_potts(
     double* input_data,
     double* weights,
     const int data_length,
@@ -27,24 +241,78 @@ __declspec(dllexport) int l2_potts(
     int* split_indexes,
     double* leaves
 ){
-    double* cumulative_first_moments = malloc((data_length + 1)*sizeof(double));
-    double* cumulative_second_moments = malloc((data_length + 1)*sizeof(double));
-    double* cumulative_weights = malloc((data_length + 1)*sizeof(double));
-    cumulative_first_moments[0] = 0.0;
-    cumulative_second_moments[0] = 0.0;
-    cumulative_weights[0] = 0.0;
+    double* double_workspace = malloc((4*(size_t)data_length + 3)*sizeof(double));
+    int* int_workspace = malloc(data_length*sizeof(int));
 
-    double weight, weighted_data;
-    for (int j = 0; j < data_length; j++){
-        weight = weights[j];
-        weighted_data = weight*input_data[j];
-        cumulative_first_moments[j + 1] = cumulative_first_moments[j] + weighted_data;
-        cumulative_second_moments[j + 1] = cumulative_second_moments[j] + weighted_data*input_data[j];
-        cumulative_weights[j + 1] = cumulative_weights[j] + weight;
-    }
+    int leave_count = l2_potts_buffered(
+        input_data, weights, data_length, l0_fused_regularization,
+        l2_regularization, excluded_interval_size, split_indexes, leaves,
+        NULL, double_workspace, int_workspace
+    );
+
+    free(double_workspace);
+    free(int_workspace);
+
+    return leave_count;
+}
+
+/**
+ * @brief Calculate piecewise constant approximations using Potts regularization,
+ * pruning the candidate jumps as in PELT.
+ *
+ * The interval cost is subadditive, so once the cost of a candidate jump plus
+ * its last interval exceeds the optimal cost at some right end, that right end
+ * is a better jump for every later right end, and the candidate is discarded
+ * as soon as that right end becomes admissible. This keeps a shrinking set of
+ * candidate jumps, giving near-linear expected time when the signal has many
+ * jumps, with the same optimal partition as l2_potts.
+ *
+ * Like l2_potts_buffered, it does not allocate memory.
+ *
+ * @param input_data The input data array.
+ * @param weights The array of weights associated with input_data.
+ * @param data_length The length of input_data and weights arrays.
+ * @param l0_fused_regularization The L0 fused regularization parameter.
+ * @param l2_regularization The L2 regularization parameter.
+ * @param excluded_interval_size The maximum interval size to exclude.
+ * @param split_indexes Output array to store split indexes.
+ * @param leaves Output array to store the piecewise constant values.
+ * @param objective Output array of length 2 to store the weighted squared error
+ * and the L2 penalty of the approximation.
+ * @param double_workspace Workspace array of length 5*data_length + 3.
+ * @param int_workspace Workspace array of length 3*data_length.
+ * @return The number of leaves in the piecewise approximation.
+ */
+POTTS_EXPORT int l2_potts_pelt_buffered(
+    double* input_data,
+    double* weights,
+    const int data_length,
+    const double l0_fused_regularization,
+    const double l2_regularization,
+    const int excluded_interval_size,
+    int* split_indexes,
+    double* leaves,
+    double* objective,
+    double* double_workspace,
+    int* int_workspace
+){
+    double* cumulative_first_moments = double_workspace;
+    double* cumulative_second_moments = cumulative_first_moments + data_length + 1;
+    double* cumulative_weights = cumulative_second_moments + data_length + 1;
+    double* potts_values = cumulative_weights + data_length + 1;
+    double* candidate_values = potts_values + data_length;
+    int* jumps = int_workspace;
+    // Candidate jumps in increasing order, with the right end that pruned them
+    int* candidates = jumps + data_length;
+    int* pruned_at = candidates + data_length;
+
+    cumulative_moments(
+        input_data, weights, data_length,
+        cumulative_first_moments, cumulative_second_moments, cumulative_weights
+    );
 
-    int* jumps = malloc(data_length*sizeof(int));
-    double* potts_values = malloc(data_length*sizeof(double));
+    int candidate_count = 0;
+    int kept_count, first_evaluated, left;
     double deviation, candidate, first_moments, first_moments_difference;
     for (int right = 1; right <= data_length; right++){
         first_moments = cumulative_first_moments[right];
@@ -52,7 +320,27 @@ __declspec(dllexport) int l2_potts(
         first_moments*first_moments/(cumulative_weights[right] + l2_regularization*right);
         jumps[right - 1] = 0;
 
-        for (int left = right - excluded_interval_size - 1; left >= 1; left--){
+        // Drop the candidates whose pruning right end is now admissible
+        kept_count = 0;
+        for (int i = 0; i < candidate_count; i++){
+            left = candidates[i];
+            if (pruned_at[i] < 0 || pruned_at[i] + excluded_interval_size + 1 > right){
+                candidates[kept_count] = left;
+                pruned_at[kept_count] = pruned_at[i];
+                kept_count++;
+            }
+        }
+        candidate_count = kept_count;
+        left = right - excluded_interval_size - 1;
+        if (left >= 1){
+            candidates[candidate_count] = left;
+            pruned_at[candidate_count] = -1;
+            candidate_count++;
+        }
+
+        first_evaluated = candidate_count;
+        for (int i = candidate_count - 1; i >= 0; i--){
+            left = candidates[i];
             first_moments_difference = first_moments - cumulative_first_moments[left];
             deviation = l0_fused_regularization +
                 cumulative_second_moments[right] - cumulative_second_moments[left] -
@@ -63,36 +351,368 @@ __declspec(dllexport) int l2_potts(
                 break;
             }
             candidate = potts_values[left - 1] + deviation;
+            candidate_values[i] = candidate;
+            first_evaluated = i;
             if (candidate < potts_values[right - 1]){
                 potts_values[right - 1] = candidate;
                 jumps[right - 1] = left;
             }
         }
-    }
 
-    int right = data_length;
-    int left = jumps[data_length - 1];
-    double mean;
-    int leave_count = 0;
-    while (right > 0){
-        mean = (cumulative_first_moments[right] - cumulative_first_moments[left])/
-            (cumulative_weights[right] - cumulative_weights[left] + l2_regularization*
-            (right - left));
-        leaves[leave_count] = mean;
-        split_indexes[leave_count] = left;
-        right = left;
-        if (right < 1){
-            break;
+        for (int i = first_evaluated; i < candidate_count; i++){
+            if (pruned_at[i] < 0 &&
+                candidate_values[i] > potts_values[right - 1] + l0_fused_regularization){
+                pruned_at[i] = right;
+            }
         }
-        left = jumps[right - 1];
-        leave_count++;
     }
 
-    free(cumulative_first_moments);
-    free(cumulative_second_moments);
-    free(cumulative_weights);
-    free(jumps);
-    free(potts_values);
+    return potts_backtrack(
+        cumulative_first_moments, cumulative_second_moments, cumulative_weights,
+        data_length, l2_regularization, jumps, split_indexes, leaves, objective
+    );
+}
+
+/**
+ * @brief Calculate piecewise constant approximations using Potts regularization,
+ * pruning the candidate jumps as in PELT.
+ *
+ * Same as l2_potts_pelt_buffered, allocating the workspaces.
+ *
+ * @param input_data The input data array.
+ * @param weights The array of weights associated with input_data.
+ * @param data_length The length of input_data and weights arrays.
+ * @param l0_fused_regularization The L0 fused regularization parameter.
+ * @param l2_regularization The L2 regularization parameter.
+ * @param excluded_interval_size The maximum interval size to exclude.
+ * @param split_indexes Output array to store split indexes.
+ * @param leaves Output array to store the piecewise constant values.
+ * @return The number of leaves in the piecewise approximation.
+ */
+POTTS_EXPORT int l2_potts_pelt(
+    double* input_data,
+    double* weights,
+    const int data_length,
+    const double l0_fused_regularization,
+    const double l2_regularization,
+    const int excluded_interval_size,
+    int* split_indexes,
+    double* leaves
+){
+    double* double_workspace = malloc((5*(size_t)data_length + 3)*sizeof(double));
+    int* int_workspace = malloc(3*(size_t)data_length*sizeof(int));
+
+    int leave_count = l2_potts_pelt_buffered(
+        input_data, weights, data_length, l0_fused_regularization,
+        l2_regularization, excluded_interval_size, split_indexes, leaves,
+        NULL, double_workspace, int_workspace
+    );
+
+    free(double_workspace);
+    free(int_workspace);
 
     return leave_count;
 }
+
+/**
+ * @brief Solve the Potts problem for several L0 fused regularization values.
+ *
+ * The cumulative moments and the workspace are shared between all the solves.
+ * The outputs of the i-th solve are stored in the i-th row of split_indexes
+ * and leaves, which are row-major arrays of shape (lambda_count, data_length).
+ * The workspaces have the same sizes as for l2_potts_buffered, and no memory
+ * is allocated.
+ *
+ * @param input_data The input data array.
+ * @param weights The array of weights associated with input_data.
+ * @param data_length The length of input_data and weights arrays.
+ * @param l0_fused_regularizations The L0 fused regularization parameters.
+ * @param lambda_count The length of l0_fused_regularizations.
+ * @param l2_regularization The L2 regularization parameter.
+ * @param excluded_interval_size The maximum interval size to exclude.
+ * @param split_indexes Output array to store split indexes.
+ * @param leaves Output array to store the piecewise constant values.
+ * @param leave_counts Output array to store the number of leaves of each solve.
+ * @param objectives Output array of shape (lambda_count, 2) to store the
+ * objective of each solve, see l2_potts_buffered, or NULL.
+ * @param double_workspace Workspace array of length 4*data_length + 3.
+ * @param int_workspace Workspace array of length data_length.
+ */
+POTTS_EXPORT void l2_potts_batch_buffered(
+    double* input_data,
+    double* weights,
+    const int data_length,
+    double* l0_fused_regularizations,
+    const int lambda_count,
+    const double l2_regularization,
+    const int excluded_interval_size,
+    int* split_indexes,
+    double* leaves,
+    int* leave_counts,
+    double* objectives,
+    double* double_workspace,
+    int* int_workspace
+){
+    double* cumulative_first_moments = double_workspace;
+    double* cumulative_second_moments = cumulative_first_moments + data_length + 1;
+    double* cumulative_weights = cumulative_second_moments + data_length + 1;
+    double* potts_values = cumulative_weights + data_length + 1;
+    int* jumps = int_workspace;
+
+    cumulative_moments(
+        input_data, weights, data_length,
+        cumulative_first_moments, cumulative_second_moments, cumulative_weights
+    );
+    for (int i = 0; i < lambda_count; i++){
+        leave_counts[i] = potts_partition(
+            cumulative_first_moments, cumulative_second_moments, cumulative_weights,
+            data_length, l0_fused_regularizations[i], l2_regularization,
+            excluded_interval_size, jumps, potts_values,
+            split_indexes + (size_t)i*data_length, leaves + (size_t)i*data_length,
+            objectives == NULL ? NULL : objectives + 2*(size_t)i
+        );
+    }
+}
+
+/**
+ * @brief Solve the Potts problem for several L0 fused regularization values.
+ *
+ * Same as l2_potts_batch_buffered, allocating the workspaces.
+ *
+ * @param input_data The input data array.
+ * @param weights The array of weights associated with input_data.
+ * @param data_length The length of input_data and weights arrays.
+ * @param l0_fused_regularizations The L0 fused regularization parameters.
+ * @param lambda_count The length of l0_fused_regularizations.
+ * @param l2_regularization The L2 regularization parameter.
+ * @param excluded_interval_size The maximum interval size to exclude.
+ * @param split_indexes Output array to store split indexes.
+ * @param leaves Output array to store the piecewise constant values.
+ * @param leave_counts Output array to store the number of leaves of each solve.
+ */
+POTTS_EXPORT void l2_potts_batch(
+    double* input_data,
+    double* weights,
+    const int data_length,
+    double* l0_fused_regularizations,
+    const int lambda_count,
+    const double l2_regularization,
+    const int excluded_interval_size,
+    int* split_indexes,
+    double* leaves,
+    int* leave_counts
+){
+    double* double_workspace = malloc((4*(size_t)data_length + 3)*sizeof(double));
+    int* int_workspace = malloc(data_length*sizeof(int));
+
+    l2_potts_batch_buffered(
+        input_data, weights, data_length, l0_fused_regularizations, lambda_count,
+        l2_regularization, excluded_interval_size, split_indexes, leaves,
+        leave_counts, NULL, double_workspace, int_workspace
+    );
+
+    free(double_workspace);
+    free(int_workspace);
+}
+
+/**
+ * @brief Calculate the best piecewise constant approximation for each number
+ * of splits up to max_splits, in O(max_splits*data_length^2) time.
+ *
+ * This solves the L2 regularized fit constrained to at most max_splits + 1
+ * segments. The optimal Potts partition for any L0 fused regularization
+ * parameter is also one of these approximations, so the whole regularization
+ * path can be recovered from their costs. The costs do not include the
+ * L0 penalty.
+ * A number of splits that cannot be reached because of the excluded interval
+ * size gets an infinite cost.
+ *
+ * The outputs for k splits are stored in the k-th row of split_indexes and
+ * leaves, which are row-major arrays of shape (max_splits + 1, max_splits + 1),
+ * in the same reversed order used by l2_potts. No memory is allocated.
+ *
+ * @param input_data The input data array.
+ * @param weights The array of weights associated with input_data.
+ * @param data_length The length of input_data and weights arrays.
+ * @param max_splits The maximum number of splits.
+ * @param l2_regularization The L2 regularization parameter.
+ * @param excluded_interval_size The maximum interval size to exclude.
+ * @param costs Output array of length max_splits + 1 to store the costs.
+ * @param split_indexes Output array to store split indexes.
+ * @param leaves Output array to store the piecewise constant values.
+ * @param objectives Row-major output array of shape (max_splits + 1, 2) to store
+ * the weighted squared error and the L2 penalty of each approximation, or NULL.
+ * @param double_workspace Workspace array of length
+ * (max_splits + 4)*(data_length + 1).
+ * @param int_workspace Workspace array of length
+ * (max_splits + 1)*(data_length + 1).
+ */
+POTTS_EXPORT void l2_potts_segments_buffered(
+    double* input_data,
+    double* weights,
+    const int data_length,
+    const int max_splits,
+    const double l2_regularization,
+    const int excluded_interval_size,
+    double* costs,
+    int* split_indexes,
+    double* leaves,
+    double* objectives,
+    double* double_workspace,
+    int* int_workspace
+){
+    double* cumulative_first_moments = double_workspace;
+    double* cumulative_second_moments = cumulative_first_moments + data_length + 1;
+    double* cumulative_weights = cumulative_second_moments + data_length + 1;
+    double* best_values = cumulative_weights + data_length + 1;
+    double* potts_values = best_values + max_splits + 1;
+    int* is_searching = int_workspace;
+    int* jumps = is_searching + max_splits + 1;
+
+    cumulative_moments(
+        input_data, weights, data_length,
+        cumulative_first_moments, cumulative_second_moments, cumulative_weights
+    );
+
+    // potts_values[k*data_length + right - 1] is the best cost of the first
+    // right values with k splits. The deviation of each interval is computed
+    // once and shared by all the numbers of splits, each of which stops
+    // searching once the deviation exceeds its best value, or once the first
+    // left values are too few to hold k - 1 splits.
+    double first_moments, first_moments_difference, deviation, candidate;
+    int searching_count, highest_split_count, feasible_split_count;
+    for (int right = 1; right <= data_length; right++){
+        first_moments = cumulative_first_moments[right];
+        potts_values[right - 1] = cumulative_second_moments[right] -
+        first_moments*first_moments/(cumulative_weights[right] + l2_regularization*right);
+        jumps[right - 1] = 0;
+        for (int k = 1; k <= max_splits; k++){
+            best_values[k] = HUGE_VAL;
+            is_searching[k] = 1;
+            jumps[(size_t)k*data_length + right - 1] = 0;
+        }
+        searching_count = max_splits;
+        highest_split_count = max_splits;
+
+        for (int left = right - excluded_interval_size - 1;
+             left >= 1 && searching_count > 0; left--){
+            feasible_split_count = (left - 1)/(excluded_interval_size + 1) + 1;
+            while (highest_split_count > feasible_split_count){
+                if (is_searching[highest_split_count]){
+                    is_searching[highest_split_count] = 0;
+                    searching_count--;
+                }
+                highest_split_count--;
+            }
+            if (searching_count == 0){
+                break;
+            }
+            first_moments_difference = first_moments - cumulative_first_moments[left];
+            deviation = cumulative_second_moments[right] -
+                cumulative_second_moments[left] -
+                first_moments_difference*first_moments_difference/
+                (cumulative_weights[right] - cumulative_weights[left] +
+                l2_regularization*(right - left));
+            for (int k = 1; k <= highest_split_count; k++){
+                if (!is_searching[k]){
+                    continue;
+                }
+                if (deviation > best_values[k]){
+                    is_searching[k] = 0;
+                    searching_count--;
+                    continue;
+                }
+                candidate = potts_values[(size_t)(k - 1)*data_length + left - 1] +
+                    deviation;
+                if (candidate < best_values[k]){
+                    best_values[k] = candidate;
+                    jumps[(size_t)k*data_length + right - 1] = left;
+                }
+            }
+        }
+        for (int k = 1; k <= max_splits; k++){
+            potts_values[(size_t)k*data_length + right - 1] = best_values[k];
+        }
+    }
+    for (int k = 0; k <= max_splits; k++){
+        costs[k] = potts_values[(size_t)k*data_length + data_length - 1];
+    }
+
+    for (int k = 0; k <= max_splits; k++){
+        if (costs[k] == HUGE_VAL){
+            continue;
+        }
+        int* row_split_indexes = split_indexes + (size_t)k*(max_splits + 1);
+        double* row_leaves = leaves + (size_t)k*(max_splits + 1);
+        int right = data_length;
+        int layer = k;
+        int left = jumps[(size_t)layer*data_length + right - 1];
+        int leave_count = 0;
+        double mean, penalty, total_fidelity = 0.0, total_penalty = 0.0;
+        while (right > 0){
+            first_moments = cumulative_first_moments[right] -
+                cumulative_first_moments[left];
+            mean = first_moments/
+                (cumulative_weights[right] - cumulative_weights[left] +
+                l2_regularization*(right - left));
+            row_leaves[leave_count] = mean;
+            row_split_indexes[leave_count] = left;
+            penalty = l2_regularization*(right - left)*mean*mean;
+            total_fidelity += cumulative_second_moments[right] -
+                cumulative_second_moments[left] - mean*first_moments - penalty;
+            total_penalty += penalty;
+            right = left;
+            if (right < 1){
+                break;
+            }
+            layer--;
+            left = jumps[(size_t)layer*data_length + right - 1];
+            leave_count++;
+        }
+        if (objectives != NULL){
+            objectives[2*k] = total_fidelity;
+            objectives[2*k + 1] = total_penalty;
+        }
+    }
+}
+
+/**
+ * @brief Calculate the best piecewise constant approximation for each number
+ * of splits up to max_splits.
+ *
+ * Same as l2_potts_segments_buffered, allocating the workspaces.
+ *
+ * @param input_data The input data array.
+ * @param weights The array of weights associated with input_data.
+ * @param data_length The length of input_data and weights arrays.
+ * @param max_splits The maximum number of splits.
+ * @param l2_regularization The L2 regularization parameter.
+ * @param excluded_interval_size The maximum interval size to exclude.
+ * @param costs Output array of length max_splits + 1 to store the costs.
+ * @param split_indexes Output array to store split indexes.
+ * @param leaves Output array to store the piecewise constant values.
+ */
+POTTS_EXPORT void l2_potts_segments(
+    double* input_data,
+    double* weights,
+    const int data_length,
+    const int max_splits,
+    const double l2_regularization,
+    const int excluded_interval_size,
+    double* costs,
+    int* split_indexes,
+    double* leaves
+){
+    size_t size = (size_t)(max_splits + 1)*(data_length + 1);
+    double* double_workspace = malloc((size + 3*((size_t)data_length + 1))*sizeof(double));
+    int* int_workspace = malloc(size*sizeof(int));
+
+    l2_potts_segments_buffered(
+        input_data, weights, data_length, max_splits, l2_regularization,
+        excluded_interval_size, costs, split_indexes, leaves, NULL,
+        double_workspace, int_workspace
+    );
+
+    free(double_workspace);
+    free(int_workspace);
+}
@@ -1,10 +1,17 @@
 """Python wrapper for C potts module"""
 import ctypes
+import glob
 import platform
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from importlib.machinery import EXTENSION_SUFFIXES
 from os.path import abspath
 from os.path import dirname
 from os.path import join
+from typing import Callable
+from typing import List
 from typing import Optional
+from typing import Sequence
 from typing import Tuple
 
 import numpy as np
@@ -12,9 +19,365 @@ import numpy as np
 
 os_name = platform.system()
 path = dirname(abspath(__file__))
-clib_path = join(path, "l2_potts.dll")
-loader = ctypes.CDLL(clib_path)
-loader.l2_potts.argtypes = (
+
+
+def _library_candidates() -> list[str]:
+    """List the native library files that can be loaded on this platform.
+
+    On Windows the prebuilt ``l2_potts.dll`` is used. On other platforms the
+    library is built by ``setup.py`` as a shared extension, so its name carries
+    the interpreter's extension suffix, e.g. ``l2_potts.cpython-311-*.so``.
+    A plain ``l2_potts.so`` or ``l2_potts.dylib`` compiled by hand is also
+    accepted.
+    """
+    if os_name == "Windows":
+        return [join(path, "l2_potts.dll")]
+    suffixes = [*EXTENSION_SUFFIXES, ".so", ".dylib"]
+    candidates = []
+    for suffix in suffixes:
+        for candidate in sorted(glob.glob(join(path, f"l2_potts{suffix}"))):
+            if candidate not in candidates:
+                candidates.append(candidate)
+    return candidates
+
+
+def _load_library() -> ctypes.CDLL | None:
+    """Load the first native library that matches this platform.
+
+    Returns None when no library can be loaded, in which case the NumPy
+    implementation of the solver is used instead.
+    """
+    errors = []
+    for candidate in _library_candidates():
+        try:
+            return ctypes.CDLL(candidate)
+        except OSError as error:
+            errors.append(f"{candidate}: {error}")
+    warnings.warn(
+        f"Could not load the native l2_potts library for {os_name}, "
+        "falling back to the NumPy implementation. "
+        "Build it with `python setup.py build_ext --inplace` or `pip install .`."
+        + "".join(f"\n  {error}" for error in errors),
+        RuntimeWarning,
+    )
+    return None
+
+
+def _cumulative_moments(
+    input_data: np.ndarray, weights: np.ndarray, data_length: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """NumPy port of the ``cumulative_moments`` C function."""
+    weighted_data = weights * input_data
+    cumulative_first_moments = np.zeros(data_length + 1, dtype=np.float64)
+    cumulative_second_moments = np.zeros(data_length + 1, dtype=np.float64)
+    cumulative_weights = np.zeros(data_length + 1, dtype=np.float64)
+    np.cumsum(weighted_data, out=cumulative_first_moments[1:])
+    np.cumsum(weighted_data * input_data, out=cumulative_second_moments[1:])
+    np.cumsum(weights, out=cumulative_weights[1:])
+    return cumulative_first_moments, cumulative_second_moments, cumulative_weights
+
+
+def _partition_objective(
+    cumulative_first_moments: np.ndarray,
+    cumulative_second_moments: np.ndarray,
+    data_length: int,
+    l2_regularization: float,
+    leave_count: int,
+    split_indexes: np.ndarray,
+    leaves: np.ndarray,
+    objective: np.ndarray,
+) -> None:
+    """Compute the weighted squared error and the l2 penalty of a partition,
+    as done by the ``potts_backtrack`` C function, from its reversed outputs."""
+    fidelity = penalty = 0.0
+    right = data_length
+    for i in range(leave_count + 1):
+        left = split_indexes[i]
+        first_moments = cumulative_first_moments[right] - cumulative_first_moments[left]
+        interval_penalty = l2_regularization * (right - left) * leaves[i] * leaves[i]
+        fidelity += (
+            cumulative_second_moments[right]
+            - cumulative_second_moments[left]
+            - leaves[i] * first_moments
+            - interval_penalty
+        )
+        penalty += interval_penalty
+        right = left
+    objective[0] = fidelity
+    objective[1] = penalty
+
+
+def _potts_partition(
+    cumulative_first_moments: np.ndarray,
+    cumulative_second_moments: np.ndarray,
+    cumulative_weights: np.ndarray,
+    data_length: int,
+    l0_fused_regularization: float,
+    l2_regularization: float,
+    excluded_interval_size: int,
+    split_indexes: np.ndarray,
+    leaves: np.ndarray,
+    objective: Optional[np.ndarray] = None,
+) -> int:
+    """NumPy port of the ``potts_partition`` C function.
+
+    The loop over the left end of the last segment is vectorized over the
+    prefix moments. The floating point operations are done in the same order
+    as in C, and the early break and tie-breaking rules are reproduced, so the
+    outputs are identical to the native solver.
+    """
+    jumps = np.zeros(data_length, dtype=np.int64)
+    potts_values = np.empty(data_length, dtype=np.float64)
+    for right in range(1, data_length + 1):
+        first_moments = cumulative_first_moments[right]
+        second_moments = cumulative_second_moments[right]
+        best = second_moments - first_moments * first_moments / (
+            cumulative_weights[right] + l2_regularization * right
+        )
+        # Candidate left ends, in the descending order of the C loop
+        lefts = np.arange(right - excluded_interval_size - 1, 0, -1)
+        if lefts.size > 0:
+            first_moments_difference = first_moments - cumulative_first_moments[lefts]
+            deviation = (
+                l0_fused_regularization
+                + second_moments
+                - cumulative_second_moments[lefts]
+            ) - first_moments_difference * first_moments_difference / (
+                cumulative_weights[right]
+                - cumulative_weights[lefts]
+                + l2_regularization * (right - lefts)
+            )
+            candidates = potts_values[lefts - 1] + deviation
+            # The C loop breaks once the deviation exceeds the best value so far
+            best_so_far = np.empty_like(candidates)
+            best_so_far[0] = best
+            np.minimum.accumulate(candidates[:-1], out=best_so_far[1:])
+            np.minimum(best_so_far, best, out=best_so_far)
+            stopped = np.flatnonzero(deviation > best_so_far)
+            if stopped.size > 0:
+                candidates = candidates[: stopped[0]]
+            if candidates.size > 0:
+                index = np.argmin(candidates)
+                if candidates[index] < best:
+                    best = candidates[index]
+                    jumps[right - 1] = lefts[index]
+        potts_values[right - 1] = best
+
+    right = data_length
+    left = jumps[data_length - 1]
+    leave_count = 0
+    while right > 0:
+        leaves[leave_count] = (
+            cumulative_first_moments[right] - cumulative_first_moments[left]
+        ) / (
+            cumulative_weights[right]
+            - cumulative_weights[left]
+            + l2_regularization * (right - left)
+        )
+        split_indexes[leave_count] = left
+        right = left
+        if right < 1:
+            break
+        left = jumps[right - 1]
+        leave_count += 1
+    if objective is not None:
+        _partition_objective(
+            cumulative_first_moments,
+            cumulative_second_moments,
+            data_length,
+            l2_regularization,
+            leave_count,
+            split_indexes,
+            leaves,
+            objective,
+        )
+    return leave_count
+
+
+def _l2_potts_numpy(
+    input_data: np.ndarray,
+    weights: np.ndarray,
+    data_length: int,
+    l0_fused_regularization: float,
+    l2_regularization: float,
+    excluded_interval_size: int,
+    split_indexes: np.ndarray,
+    leaves: np.ndarray,
+    objective: Optional[np.ndarray] = None,
+    double_workspace: Optional[np.ndarray] = None,
+    int_workspace: Optional[np.ndarray] = None,
+) -> int:
+    """NumPy port of the ``l2_potts_buffered`` C function, with the same
+    signature. The workspaces are not used."""
+    return _potts_partition(
+        *_cumulative_moments(input_data, weights, data_length),
+        data_length,
+        l0_fused_regularization,
+        l2_regularization,
+        excluded_interval_size,
+        split_indexes,
+        leaves,
+        objective,
+    )
+
+
+def _l2_potts_batch_numpy(
+    input_data: np.ndarray,
+    weights: np.ndarray,
+    data_length: int,
+    l0_fused_regularizations: np.ndarray,
+    lambda_count: int,
+    l2_regularization: float,
+    excluded_interval_size: int,
+    split_indexes: np.ndarray,
+    leaves: np.ndarray,
+    leave_counts: np.ndarray,
+    objectives: Optional[np.ndarray] = None,
+    double_workspace: Optional[np.ndarray] = None,
+    int_workspace: Optional[np.ndarray] = None,
+) -> None:
+    """NumPy port of the ``l2_potts_batch_buffered`` C function, with the same
+    signature. The workspaces are not used."""
+    moments = _cumulative_moments(input_data, weights, data_length)
+    for i in range(lambda_count):
+        leave_counts[i] = _potts_partition(
+            *moments,
+            data_length,
+            l0_fused_regularizations[i],
+            l2_regularization,
+            excluded_interval_size,
+            split_indexes[i],
+            leaves[i],
+            None if objectives is None else objectives[i],
+        )
+
+
+def _l2_potts_segments_numpy(
+    input_data: np.ndarray,
+    weights: np.ndarray,
+    data_length: int,
+    max_splits: int,
+    l2_regularization: float,
+    excluded_interval_size: int,
+    costs: np.ndarray,
+    split_indexes: np.ndarray,
+    leaves: np.ndarray,
+    objectives: Optional[np.ndarray] = None,
+    double_workspace: Optional[np.ndarray] = None,
+    int_workspace: Optional[np.ndarray] = None,
+) -> None:
+    """NumPy port of the ``l2_potts_segments_buffered`` C function, with the
+    same signature. The workspaces are not used.
+
+    For each right end, the loop over the left end is vectorized over the
+    prefix moments and over the number of splits.
+    """
+    (
+        cumulative_first_moments,
+        cumulative_second_moments,
+        cumulative_weights,
+    ) = _cumulative_moments(input_data, weights, data_length)
+    jumps = np.zeros((max_splits + 1, data_length), dtype=np.int64)
+    values = np.full((max_splits + 1, data_length), np.inf)
+    for right in range(1, data_length + 1):
+        first_moments = cumulative_first_moments[right]
+        second_moments = cumulative_second_moments[right]
+        values[0, right - 1] = second_moments - first_moments * first_moments / (
+            cumulative_weights[right] + l2_regularization * right
+        )
+        lefts = np.arange(right - excluded_interval_size - 1, 0, -1)
+        if lefts.size == 0 or max_splits == 0:
+            continue
+        first_moments_difference = first_moments - cumulative_first_moments[lefts]
+        deviation = (
+            second_moments - cumulative_second_moments[lefts]
+        ) - first_moments_difference * first_moments_difference / (
+            cumulative_weights[right]
+            - cumulative_weights[lefts]
+            + l2_regularization * (right - lefts)
+        )
+        candidates = values[:-1, lefts - 1] + deviation
+        # The C loop breaks once the deviation exceeds the best value so far
+        best_so_far = np.empty_like(candidates)
+        best_so_far[:, 0] = np.inf
+        np.minimum.accumulate(candidates[:, :-1], axis=1, out=best_so_far[:, 1:])
+        candidates[np.logical_or.accumulate(deviation > best_so_far, axis=1)] = np.inf
+        index = np.argmin(candidates, axis=1)
+        best = candidates[np.arange(max_splits), index]
+        values[1:, right - 1] = best
+        jumps[1:, right - 1] = np.where(np.isfinite(best), lefts[index], 0)
+    costs[:] = values[:, data_length - 1]
+
+    for k in range(max_splits + 1):
+        if costs[k] == np.inf:
+            continue
+        right = data_length
+        layer = k
+        left = jumps[layer, right - 1]
+        leave_count = 0
+        while right > 0:
+            leaves[k, leave_count] = (
+                cumulative_first_moments[right] - cumulative_first_moments[left]
+            ) / (
+                cumulative_weights[right]
+                - cumulative_weights[left]
+                + l2_regularization * (right - left)
+            )
+            split_indexes[k, leave_count] = left
+            right = left
+            if right < 1:
+                break
+            layer -= 1
+            left = jumps[layer, right - 1]
+            leave_count += 1
+        if objectives is not None:
+            _partition_objective(
+                cumulative_first_moments,
+                cumulative_second_moments,
+                data_length,
+                l2_regularization,
+                k,
+                split_indexes[k],
+                leaves[k],
+                objectives[k],
+            )
+
+
+def _native_function(
+    name: str, argtypes: tuple, restype: Optional[type]
+) -> Optional[Callable]:
+    """Get a function of the native library with its signature, or None if
+    the library is missing or does not export it."""
+    if loader is None or not hasattr(loader, name):
+        return None
+    function = getattr(loader, name)
+    function.argtypes = argtypes
+    function.restype = restype
+    return function
+
+
+def _select_solver(
+    name: str,
+    argtypes: tuple,
+    output_argtypes: tuple,
+    restype: Optional[type],
+    fallback: Callable,
+) -> Callable:
+    """Choose the implementation of a solver with the buffered calling
+    convention: the native buffered function, or the given fallback if the
+    library is missing or was built without it.
+
+    The buffered function takes the extra outputs and the workspaces after
+    the arguments of the allocating one, whose signature is also declared.
+    """
+    _native_function(name, argtypes, restype)
+    buffered = _native_function(
+        f"{name}_buffered", argtypes + output_argtypes + _WORKSPACE_ARGTYPES, restype
+    )
+    return fallback if buffered is None else buffered
+
+
+_POTTS_ARGTYPES = (
     np.ctypeslib.ndpointer(dtype=np.float64, ndim=1),  # input
     np.ctypeslib.ndpointer(dtype=np.float64, ndim=1),  # weights
     ctypes.c_int,  # data size
@@ -24,7 +387,152 @@ loader.l2_potts.argtypes = (
     np.ctypeslib.ndpointer(dtype=np.int32, ndim=1),  # split indexes
     np.ctypeslib.ndpointer(dtype=np.float64, ndim=1),  # leaves
 )
-loader.l2_potts.restype = ctypes.c_uint
+_BATCH_ARGTYPES = (
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=1),  # input
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=1),  # weights
+    ctypes.c_int,  # data size
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=1),  # l0 regularizations
+    ctypes.c_int,  # number of l0 regularizations
+    ctypes.c_double,  # l2 regularization
+    ctypes.c_int,  # excluded interval size
+    np.ctypeslib.ndpointer(dtype=np.int32, ndim=2, flags="C"),  # splits
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=2, flags="C"),  # leaves
+    np.ctypeslib.ndpointer(dtype=np.int32, ndim=1),  # leave counts
+)
+_SEGMENTS_ARGTYPES = (
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=1),  # input
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=1),  # weights
+    ctypes.c_int,  # data size
+    ctypes.c_int,  # max splits
+    ctypes.c_double,  # l2 regularization
+    ctypes.c_int,  # excluded interval size
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=1),  # costs
+    np.ctypeslib.ndpointer(dtype=np.int32, ndim=2, flags="C"),  # splits
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=2, flags="C"),  # leaves
+)
+_WORKSPACE_ARGTYPES = (
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=1, flags="C"),  # doubles
+    np.ctypeslib.ndpointer(dtype=np.int32, ndim=1, flags="C"),  # ints
+)
+
+# The native functions are called through ctypes.CDLL, which releases the GIL
+# for the duration of each call. The buffered ones only write to the arrays
+# they are given, so solves with distinct buffers can run in parallel threads.
+# The NumPy fallbacks hold the GIL and allocate their temporaries.
+loader = _load_library()
+_l2_potts_solver = _select_solver(
+    "l2_potts",
+    _POTTS_ARGTYPES,
+    (np.ctypeslib.ndpointer(dtype=np.float64, ndim=1),),  # objective
+    ctypes.c_uint,
+    _l2_potts_numpy,
+)
+# The pruning only changes the running time, not the optimal partition
+_l2_potts_pelt_solver = _select_solver(
+    "l2_potts_pelt",
+    _POTTS_ARGTYPES,
+    (np.ctypeslib.ndpointer(dtype=np.float64, ndim=1),),  # objective
+    ctypes.c_uint,
+    _l2_potts_solver,
+)
+_l2_potts_batch_solver = _select_solver(
+    "l2_potts_batch",
+    _BATCH_ARGTYPES,
+    (np.ctypeslib.ndpointer(dtype=np.float64, ndim=2, flags="C"),),  # objectives
+    None,
+    _l2_potts_batch_numpy,
+)
+_l2_potts_segments_solver = _select_solver(
+    "l2_potts_segments",
+    _SEGMENTS_ARGTYPES,
+    (np.ctypeslib.ndpointer(dtype=np.float64, ndim=2, flags="C"),),  # objectives
+    None,
+    _l2_potts_segments_numpy,
+)
+
+
+def _workspace_sizes(
+    method: str, data_length: int, max_splits: int = 0
+) -> Tuple[int, int]:
+    """Get the sizes of the float and integer workspaces of a buffered solver.
+
+    The method is one of "dp", "pelt", "batch" or "segments".
+    """
+    if method == "pelt":
+        return 5 * data_length + 3, 3 * data_length
+    if method == "segments":
+        size = (max_splits + 1) * (data_length + 1)
+        return size + 3 * (data_length + 1), size
+    return 4 * data_length + 3, data_length
+
+
+class PottsWorkspace:
+    """Preallocated buffers reused by successive Potts solves.
+
+    It holds the solver workspaces, the output buffers and unit weights.
+    The buffers only grow when a longer signal or more splits are requested,
+    so sizing it with the maximum number of bins of the data avoids any
+    allocation in the solves. It must not be shared between threads.
+
+    Parameters
+    ----------
+    capacity : int, default=0
+        Length of the longest signal to solve.
+    max_splits : int, default=0
+        Largest maximum number of splits of `l2_potts_segments`
+        and `l2_potts_path`.
+
+    """
+
+    def __init__(self, capacity: int = 0, max_splits: int = 0):
+        self.capacity = -1
+        self.max_splits = -1
+        self.reserve(capacity, max_splits)
+
+    def reserve(self, capacity: int, max_splits: int = 0) -> None:
+        """Grow the buffers to solve signals of the given length."""
+        if capacity <= self.capacity and max_splits <= self.max_splits:
+            return
+        self.capacity = capacity = max(capacity, self.capacity)
+        self.max_splits = max_splits = max(max_splits, self.max_splits)
+        sizes = [
+            _workspace_sizes(method, capacity, max_splits)
+            for method in ("pelt", "segments")
+        ]
+        self.double_workspace = np.empty(
+            max(size for size, _ in sizes), dtype=np.float64
+        )
+        self.int_workspace = np.empty(max(size for _, size in sizes), dtype=np.int32)
+        self.ones = np.ones(capacity, dtype=np.float64)
+        self.split_indexes = np.empty(capacity, dtype=np.int32)
+        self.leaves = np.empty(capacity, dtype=np.float64)
+        self.objective = np.empty(2, dtype=np.float64)
+        self.costs = np.empty(max_splits + 1, dtype=np.float64)
+        self.segment_objectives = np.empty((max_splits + 1, 2), dtype=np.float64)
+        self.segment_split_indexes = np.empty((max_splits + 1) ** 2, dtype=np.int32)
+        self.segment_leaves = np.empty((max_splits + 1) ** 2, dtype=np.float64)
+
+
+def _get_workspace(
+    workspace: Optional[PottsWorkspace], capacity: int, max_splits: int = 0
+) -> PottsWorkspace:
+    """Reserve the given workspace, or allocate one for a single solve."""
+    if workspace is None:
+        return PottsWorkspace(capacity, max_splits)
+    workspace.reserve(capacity, max_splits)
+    return workspace
+
+
+def _unpack_partition(
+    x: np.ndarray, counter: int, split_indexes: np.ndarray, leaves: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert the reversed outputs of the solver to leaves and split values."""
+    leaves = leaves[counter::-1].copy()
+    split_indexes = (
+        split_indexes[counter - 1 :: -1] if counter > 0 else np.empty(0, dtype=np.int32)
+    )
+    split_values = x[split_indexes]
+    return leaves, split_values
 
 
 def l2_potts(
@@ -34,7 +542,13 @@ def l2_potts(
     l0_fused_regularization: float = 1.0,
     l2_regularization: float = 0.0,
     excluded_interval_size: int = 0,
-) -> Tuple[np.ndarray[float], np.ndarray[float]]:
+    method: str = "dp",
+    workspace: Optional[PottsWorkspace] = None,
+    return_objective: bool = False,
+) -> (
+    Tuple[np.ndarray[float], np.ndarray[float]]
+    | Tuple[np.ndarray[float], np.ndarray[float], float, float]
+):
     """Denoise a 1D signal using the Potts model.
 
     Parameters
@@ -51,6 +565,15 @@ def l2_potts(
         Regularization parameter for the l2 norm.
     excluded_interval_size : int, default=0
         Minimum size of intervals that should not be denoised.
+    method : {"dp", "pelt"}, default="dp"
+        The solver to use. "dp" is the quadratic dynamic program, and "pelt"
+        prunes the candidate jumps as in PELT, which gives the same partition
+        in near-linear expected time, and is faster for long signals.
+    workspace : PottsWorkspace, optional
+        Buffers to reuse for the solve. If None, they are allocated.
+    return_objective : bool, default=False
+        Whether to also return the terms of the objective of the tree,
+        which the solver computes along with it.
 
     Returns
     -------
@@ -58,26 +581,328 @@ def l2_potts(
         Leaves of the tree.
     split_values : np.ndarray[float]
         Splits of the tree.
+    fidelity : float
+        Weighted squared error of the tree on the signal.
+        Only returned if `return_objective` is True.
+    penalty : float
+        L2 penalty of the tree, the l2 regularization times the sum of the
+        squared leaves weighted by their number of values.
+        Only returned if `return_objective` is True.
+
+    Notes
+    -----
+    The native solver releases the GIL and only uses the workspace buffers,
+    so this function can be called from several threads at once with distinct
+    workspaces, e.g. to fit ``ListTreeRegressor`` instances in a
+    ``ThreadPoolExecutor``. When the native library cannot be loaded, the
+    NumPy fallback holds the GIL and allocates, so the calls are serialized.
 
     """
+    if method == "dp":
+        solver = _l2_potts_solver
+    elif method == "pelt":
+        solver = _l2_potts_pelt_solver
+    else:
+        raise ValueError(f"Invalid Potts method: {method}")
+    workspace = _get_workspace(workspace, y.size)
     np_input = np.ascontiguousarray(y, dtype=np.float64)
     if weights is None:
-        weights = np.ones_like(np_input)
-    split_indexes = np.empty_like(np_input, dtype=np.int32)
-    leaves = np.empty_like(np_input, dtype=np.float64)
-    counter = loader.l2_potts(
+        weights = workspace.ones[: y.size]
+    counter = solver(
         np_input,
         weights,
         y.size,
         l0_fused_regularization,
         l2_regularization,
         excluded_interval_size,
+        workspace.split_indexes,
+        workspace.leaves,
+        workspace.objective,
+        workspace.double_workspace,
+        workspace.int_workspace,
+    )
+    tree = _unpack_partition(x, counter, workspace.split_indexes, workspace.leaves)
+    if return_objective:
+        return *tree, *workspace.objective.tolist()
+    return tree
+
+
+def l2_potts_batch(
+    x: np.ndarray[float],
+    y: np.ndarray[float],
+    weights: Optional[np.ndarray] = None,
+    l0_fused_regularizations: Sequence[float] = (1.0,),
+    l2_regularization: float = 0.0,
+    excluded_interval_size: int = 0,
+    n_jobs: int = 1,
+    workspace: Optional[PottsWorkspace] = None,
+    return_objective: bool = False,
+) -> (
+    List[Tuple[np.ndarray[float], np.ndarray[float]]]
+    | List[Tuple[np.ndarray[float], np.ndarray[float], float, float]]
+):
+    """Denoise a 1D signal using the Potts model, for several
+    l0 fused regularization parameters at once.
+
+    The cumulative moments of the signal and the solver workspace are shared
+    between all the regularization parameters. With several jobs, the
+    parameters are split between threads, each with its own workspace.
+
+    Parameters
+    ----------
+    x : np.ndarray[float]
+        Input signal times.
+    y : np.ndarray[float]
+        Input signal values.
+    weights : np.ndarray, optional
+        Weights of the input signal. If None, all weights are set to 1.
+    l0_fused_regularizations : Sequence[float], default=(1.0,)
+        Regularization parameters for the l0 fused norm.
+    l2_regularization : float, default=0.0
+        Regularization parameter for the l2 norm.
+    excluded_interval_size : int, default=0
+        Minimum size of intervals that should not be denoised.
+    n_jobs : int, default=1
+        Number of threads solving the regularization parameters.
+    workspace : PottsWorkspace, optional
+        Buffers to reuse for the solves of the first thread. If None, they are
+        allocated. The other threads always allocate their own.
+    return_objective : bool, default=False
+        Whether to also return the terms of the objective of each tree.
+
+    Returns
+    -------
+    list of tuple
+        The leaves and splits of the tree for each regularization parameter,
+        and its fidelity and penalty if `return_objective` is True,
+        as returned by `l2_potts`.
+
+    """
+    np_input = np.ascontiguousarray(y, dtype=np.float64)
+    if weights is None:
+        weights = np.ones_like(np_input)
+    lambdas = np.ascontiguousarray(l0_fused_regularizations, dtype=np.float64)
+    split_indexes = np.empty((lambdas.size, np_input.size), dtype=np.int32)
+    leaves = np.empty((lambdas.size, np_input.size), dtype=np.float64)
+    counters = np.empty(lambdas.size, dtype=np.int32)
+    objectives = np.empty((lambdas.size, 2), dtype=np.float64)
+
+    def solve_chunk(chunk: slice) -> None:
+        chunk_workspace = _get_workspace(
+            workspace if chunk.start == 0 else None, y.size
+        )
+        _l2_potts_batch_solver(
+            np_input,
+            weights,
+            y.size,
+            lambdas[chunk],
+            lambdas[chunk].size,
+            l2_regularization,
+            excluded_interval_size,
+            split_indexes[chunk],
+            leaves[chunk],
+            counters[chunk],
+            objectives[chunk],
+            chunk_workspace.double_workspace,
+            chunk_workspace.int_workspace,
+        )
+
+    bounds = np.linspace(0, lambdas.size, min(n_jobs, lambdas.size) + 1, dtype=int)
+    chunks = [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+    if len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            list(executor.map(solve_chunk, chunks))
+    elif chunks:
+        solve_chunk(chunks[0])
+    trees = [
+        _unpack_partition(x, counter, row_split_indexes, row_leaves)
+        for counter, row_split_indexes, row_leaves in zip(
+            counters, split_indexes, leaves
+        )
+    ]
+    if return_objective:
+        return [
+            (*tree, *objective) for tree, objective in zip(trees, objectives.tolist())
+        ]
+    return trees
+
+
+def _lower_hull(costs: np.ndarray) -> list[int]:
+    """Get the split counts on the lower convex hull of the costs."""
+    hull: list[int] = []
+    for k in np.flatnonzero(np.isfinite(costs)):
+        while len(hull) >= 2:
+            i, j = hull[-2], hull[-1]
+            # Remove j if it is not below the line between i and k
+            if (costs[j] - costs[i]) * (k - i) >= (costs[k] - costs[i]) * (j - i):
+                hull.pop()
+            else:
+                break
+        if hull and costs[k] >= costs[hull[-1]]:
+            continue
+        hull.append(int(k))
+    return hull
+
+
+def _solve_segments(
+    y: np.ndarray[float],
+    weights: Optional[np.ndarray],
+    max_splits: int,
+    l2_regularization: float,
+    excluded_interval_size: int,
+    workspace: Optional[PottsWorkspace],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Run the ``l2_potts_segments`` solver, returning its raw outputs,
+    which are views of the workspace buffers."""
+    workspace = _get_workspace(workspace, y.size, max_splits)
+    np_input = np.ascontiguousarray(y, dtype=np.float64)
+    if weights is None:
+        weights = workspace.ones[: y.size]
+    shape = (max_splits + 1, max_splits + 1)
+    costs = workspace.costs[: max_splits + 1]
+    split_indexes = workspace.segment_split_indexes[: shape[0] * shape[1]]
+    leaves = workspace.segment_leaves[: shape[0] * shape[1]]
+    split_indexes, leaves = split_indexes.reshape(shape), leaves.reshape(shape)
+    objectives = workspace.segment_objectives[: max_splits + 1]
+    _l2_potts_segments_solver(
+        np_input,
+        weights,
+        y.size,
+        max_splits,
+        l2_regularization,
+        excluded_interval_size,
+        costs,
         split_indexes,
         leaves,
+        objectives,
+        workspace.double_workspace,
+        workspace.int_workspace,
     )
-    leaves = leaves[counter::-1]
-    split_indexes = (
-        split_indexes[counter - 1 :: -1] if counter > 0 else np.empty(0, dtype=np.int32)
+    return costs, split_indexes, leaves, objectives
+
+
+def l2_potts_segments(
+    x: np.ndarray[float],
+    y: np.ndarray[float],
+    weights: Optional[np.ndarray] = None,
+    max_splits: int = 10,
+    l2_regularization: float = 0.0,
+    excluded_interval_size: int = 0,
+    workspace: Optional[PottsWorkspace] = None,
+    return_objective: bool = False,
+) -> List[Tuple[np.ndarray[float], np.ndarray[float], float]]:
+    """Denoise a 1D signal with a piecewise constant function with at most
+    `max_splits` splits, returning the best one for each number of splits.
+
+    Parameters
+    ----------
+    x : np.ndarray[float]
+        Input signal times.
+    y : np.ndarray[float]
+        Input signal values.
+    weights : np.ndarray, optional
+        Weights of the input signal. If None, all weights are set to 1.
+    max_splits : int, default=10
+        Maximum number of splits of the partitions.
+    l2_regularization : float, default=0.0
+        Regularization parameter for the l2 norm.
+    excluded_interval_size : int, default=0
+        Minimum size of intervals that should not be denoised.
+    workspace : PottsWorkspace, optional
+        Buffers to reuse for the solve. If None, they are allocated.
+    return_objective : bool, default=False
+        Whether to append the fidelity and penalty of each tree to its tuple,
+        see `l2_potts`.
+
+    Returns
+    -------
+    list of tuple of (np.ndarray[float], np.ndarray[float], float)
+        The leaves and splits of the best tree with k splits, as returned by
+        `l2_potts`, followed by its cost without the l0 fused penalty,
+        for each k up to `max_splits`. Numbers of splits that cannot be
+        reached because of `excluded_interval_size` are left out.
+
+    """
+    costs, split_indexes, leaves, objectives = _solve_segments(
+        y, weights, max_splits, l2_regularization, excluded_interval_size, workspace
     )
-    split_values = x[split_indexes]
-    return leaves, split_values
+    return [
+        (
+            *_unpack_partition(x, k, split_indexes[k], leaves[k]),
+            float(costs[k]),
+            *(objectives[k].tolist() if return_objective else ()),
+        )
+        for k in np.flatnonzero(np.isfinite(costs))
+    ]
+
+
+def l2_potts_path(
+    x: np.ndarray[float],
+    y: np.ndarray[float],
+    weights: Optional[np.ndarray] = None,
+    max_splits: int = 10,
+    l2_regularization: float = 0.0,
+    excluded_interval_size: int = 0,
+    workspace: Optional[PottsWorkspace] = None,
+    return_objective: bool = False,
+) -> List[Tuple[np.ndarray[float], np.ndarray[float], float, float]]:
+    """Compute the regularization path of the Potts model.
+
+    The Potts cost of a partition with k splits is its fit cost plus
+    k times the l0 fused regularization, so the optimal partitions are the
+    ones on the lower convex hull of the costs given by `l2_potts_segments`.
+
+    Parameters
+    ----------
+    x : np.ndarray[float]
+        Input signal times.
+    y : np.ndarray[float]
+        Input signal values.
+    weights : np.ndarray, optional
+        Weights of the input signal. If None, all weights are set to 1.
+    max_splits : int, default=10
+        Maximum number of splits of the partitions.
+    l2_regularization : float, default=0.0
+        Regularization parameter for the l2 norm.
+    excluded_interval_size : int, default=0
+        Minimum size of intervals that should not be denoised.
+    workspace : PottsWorkspace, optional
+        Buffers to reuse for the solve. If None, they are allocated.
+    return_objective : bool, default=False
+        Whether to append the fidelity and penalty of each tree to its tuple,
+        see `l2_potts`.
+
+    Returns
+    -------
+    list of tuple of (np.ndarray[float], np.ndarray[float], float, float)
+        The leaves and splits of each optimal tree, as returned by `l2_potts`,
+        followed by the interval of l0 fused regularization parameters on which
+        the tree is optimal among the trees with at most `max_splits` splits.
+        They are sorted by increasing number of splits.
+
+    """
+    costs, split_indexes, leaves, objectives = _solve_segments(
+        y, weights, max_splits, l2_regularization, excluded_interval_size, workspace
+    )
+    hull = _lower_hull(costs)
+    path = []
+    for position, k in enumerate(hull):
+        if position == 0:
+            upper = np.inf
+        else:
+            previous = hull[position - 1]
+            upper = (costs[previous] - costs[k]) / (k - previous)
+        if position == len(hull) - 1:
+            lower = 0.0
+        else:
+            following = hull[position + 1]
+            lower = (costs[k] - costs[following]) / (following - k)
+        path.append(
+            (
+                *_unpack_partition(x, k, split_indexes[k], leaves[k]),
+                float(lower),
+                float(upper),
+                *(objectives[k].tolist() if return_objective else ()),
+            )
+        )
+    return path
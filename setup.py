@@ -1,4 +1,6 @@
 """Setup file for the asboostreg package."""
+import platform
+
 import setuptools
 
 from model_helpers import __author__
@@ -21,6 +23,22 @@ print("Installing the asboostreg package.")
 print("Please check that the following dependencies are installed:")
 print(*install_requires, sep="\n")
 
+# The Windows library is shipped prebuilt as potts/l2_potts.dll, and must be
+# rebuilt whenever potts/l2_potts.c changes, e.g. with
+#   zig cc -target x86_64-windows-gnu -shared -O3 -s -g0 \
+#       -o potts/l2_potts.dll potts/l2_potts.c
+# On other platforms the Potts solver is compiled as a shared library.
+if platform.system() == "Windows":
+    ext_modules = []
+else:
+    ext_modules = [
+        setuptools.Extension(
+            "potts.l2_potts",
+            sources=["potts/l2_potts.c"],
+            extra_compile_args=["-O3"],
+        )
+    ]
+
 setuptools.setup(
     name="asboostreg",
     version=__version__,
@@ -42,6 +60,7 @@ setuptools.setup(
     py_modules=["asboostreg"],
     include_package_data=True,
     package_data={"potts": ["*.dll"]},
+    ext_modules=ext_modules,
     # ext_modules=cythonize("model_helpers/split_reducers.pyx"),
     # include_dirs=[np.get_include()]
 )